@@ -1,116 +1,195 @@
 import openai
 import streamlit as st
-from docx import Document
-from pptx import Presentation
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import streamlit.components.v1 as components
+from documents import chunk_paragraphs, parse_document, parse_documents
+from llm_stages import (
+    CHUNK_SUMMARY, REDUCE, FINAL_GENERATION, TEST_SCENARIOS, TRACE_CONFIRMATION, SECTION_REGENERATION,
+    RunMetadata, StageTimer,
+    REDUCE_TRIGGER_WORDS, append_run_history, build_stage_config, is_valid_summary,
+)
+from prompt_layout import build_messages, response_cache
+from hedging import hedged_call, latency_tracker
+from scenario_generator import ScenarioJob, split_frd_sections
+from traceability import build_traceability, traceability_to_xlsx
+from dry_run import APP_PIPELINE, plan_frd_run, plan_rows
+from request_packing import latency_key, packed_max_tokens, packed_messages, parse_packed_summaries
+from delta_frd import REGENERATED, ADDED, TRUNCATED, EMPTY, NOT_ADDED, generate_delta_frd
+from extractive import EXTRACTIVE_KEEP_RATIO, compress_chunks
+from llm_executor import LLM_CONCURRENCY, current_session_id, llm_executor
+from chunk_summaries import MAX_FAILED_CHUNK_RATIO, DocumentSummary, failure_summary, run_summaries
 
 # ----- CONFIGURATION -----
 OPENAI_API_KEY = 'your-openai-api-key-here'
 MODEL = 'gpt-4o'
-MAX_TOKENS_PER_CHUNK = 2000
 SUMMARY_MAX_TOKENS = 800
+# Overall time allowed for summarizing one document; unfinished chunks are marked as errors
+DOCUMENT_DEADLINE_S = 600
+# Chunk summaries run on the process-wide LLM executor; a session on its own gets the whole cap
+SUMMARY_WORKERS = LLM_CONCURRENCY
+# Per-stage model, token and latency budgets (fast model for chunk summaries)
+STAGE_CONFIG = build_stage_config(MODEL)
+STAGE_CONFIG[CHUNK_SUMMARY].max_tokens = SUMMARY_MAX_TOKENS
+
+# System prompts are module constants so every call shares the same cacheable prefix
+SUMMARY_SYSTEM_PROMPT = "Summarize the following document chunk clearly, retaining important requirements, features, and key points."
+REDUCE_SYSTEM_PROMPT = "Condense the following section summaries into one summary. Keep every requirement, feature, ID and key point; drop repetition."
+FRD_SYSTEM_PROMPT = (
+    "You are an expert business analyst. "
+    "You are given summarized versions of an existing BRD, FRD, and a new BRD. "
+    "Your task is to create a NEW FRD based on the new BRD, maintaining structure and clarity of the existing FRD."
+)
+TRACE_SYSTEM_PROMPT = "You check requirements traceability. Answer YES if the FRD section implements the BRD requirement, otherwise NO. Answer with one word."
 
 # ----- UTILITY FUNCTIONS -----
-def read_docx(uploaded_file):
-    doc = Document(uploaded_file)
-    return [para.text.strip() for para in doc.paragraphs if para.text.strip()]
-
-def read_pptx(uploaded_file):
-    prs = Presentation(uploaded_file)
-    text_runs = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text = shape.text.strip()
-                if text:
-                    text_runs.append(text)
-    return text_runs
-
-def chunk_paragraphs(paragraphs, max_tokens=MAX_TOKENS_PER_CHUNK):
-    chunks, current_chunk, current_tokens = [], [], 0
-    for para in paragraphs:
-        tokens = len(para.split())
-        if current_tokens + tokens > max_tokens:
-            chunks.append("\n".join(current_chunk))
-            current_chunk, current_tokens = [para], tokens
-        else:
-            current_chunk.append(para)
-            current_tokens += tokens
-    if current_chunk:
-        chunks.append("\n".join(current_chunk))
-    return chunks
+def call_llm(stage, messages, run_metadata=None, model=None, escalated=False, timeout=None, max_tokens=None, segments=1):
+    stage_config = STAGE_CONFIG[stage]
+    timeout = stage_config.timeout_s if timeout is None else max(0.0, min(timeout, stage_config.timeout_s))
+    if timeout <= 0:
+        raise TimeoutError(f"{stage} call started after its deadline")
+    with StageTimer(run_metadata, stage, stage_config, model, escalated) as timer:
+        timer.segments = segments
+        timer.response, timer.hedged = hedged_call(
+            lambda: openai.ChatCompletion.create(
+                model=timer.model,
+                api_key=OPENAI_API_KEY,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=max_tokens or stage_config.max_tokens,
+                request_timeout=timeout
+            ),
+            # A duplicate of a packed request would double the cost packing saves
+            latency_key(stage, segments), timeout=timeout, hedge=stage_config.hedge and segments == 1,
+            deadline_bound=timeout < stage_config.timeout_s
+        )
+    return timer.response
 
-def summarize_chunk_safe(chunk, retry_count=3):
+def summarize_chunk_safe(chunk, retry_count=3, run_metadata=None, deadline=None):
+    # Reuse earlier summaries so reference documents produce a byte-identical prompt prefix
+    cache_key = response_cache.key(STAGE_CONFIG[CHUNK_SUMMARY].model, SUMMARY_SYSTEM_PROMPT, chunk)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    messages = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": chunk}
+    ]
+    escalation_model = STAGE_CONFIG[CHUNK_SUMMARY].escalation_model
     for attempt in range(retry_count):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            break
         try:
-            response = openai.ChatCompletion.create(
-                model=MODEL,
-                api_key=OPENAI_API_KEY,
-                messages=[
-                    {"role": "system", "content": "Summarize the following document chunk clearly, retaining important requirements, features, and key points."},
-                    {"role": "user", "content": chunk}
-                ],
-                temperature=0.2,
-                max_tokens=1500
-            )
-            return response.chocies[0].message.content
+            response = call_llm(CHUNK_SUMMARY, messages, run_metadata, timeout=remaining)
+            choice = response.choices[0]
+            # Cascade: only escalate to the larger model when the fast output looks wrong
+            if escalation_model and not is_valid_summary(choice.message.content, chunk, choice.finish_reason):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                response = call_llm(CHUNK_SUMMARY, messages, run_metadata, model=escalation_model, escalated=True, timeout=remaining)
+                choice = response.choices[0]
+            response_cache.put(cache_key, choice.message.content)
+            return choice.message.content
         except Exception as e:
             print(f"Error summarizing chunk (attempt {attempt+1}): {e}")
             time.sleep(2)
-    return "[Error: Failed to summarize this chunk.]"
+    # Reported as a failed chunk by the caller, which can retry it later
+    return None
 
-def summarize_document(paragraphs):
+def summarize_pack_safe(chunks, run_metadata=None, deadline=None):
+    # Several small chunks share one request; segments that can't be used come back as None
+    # and are resubmitted to the LLM executor as single-chunk calls
+    cache_keys = [response_cache.key(STAGE_CONFIG[CHUNK_SUMMARY].model, SUMMARY_SYSTEM_PROMPT, chunk) for chunk in chunks]
+    summaries = [response_cache.get(key) for key in cache_keys]
+    pending = [i for i, summary in enumerate(summaries) if summary is None]
+    remaining = None if deadline is None else deadline - time.monotonic()
+    if len(pending) > 1 and (remaining is None or remaining > 0):
+        try:
+            response = call_llm(
+                CHUNK_SUMMARY, packed_messages([chunks[i] for i in pending]), run_metadata,
+                timeout=remaining, max_tokens=packed_max_tokens(len(pending)), segments=len(pending)
+            )
+            parsed = parse_packed_summaries(response.choices[0].message.content, len(pending)) or [None] * len(pending)
+            for i, summary in zip(pending, parsed):
+                if summary is not None and is_valid_summary(summary, chunks[i]):
+                    summaries[i] = summary
+                    response_cache.put(cache_keys[i], summary)
+        except Exception as e:
+            print(f"Error summarizing packed chunks, falling back to single calls: {e}")
+    return summaries
+
+def reduce_summaries(summary, run_metadata=None):
+    cache_key = response_cache.key(STAGE_CONFIG[REDUCE].model, REDUCE_SYSTEM_PROMPT, summary)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    response = call_llm(REDUCE, [
+        {"role": "system", "content": REDUCE_SYSTEM_PROMPT},
+        {"role": "user", "content": summary}
+    ], run_metadata)
+    response_cache.put(cache_key, response.choices[0].message.content)
+    return response.choices[0].message.content
+
+def summarize_document(paragraphs, run_metadata=None, keep_ratio=None, document="document"):
     chunks = chunk_paragraphs(paragraphs)
-    summaries = [""] * len(chunks)
-    progress_bar = st.progress(0)
-    total = len(chunks)
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(summarize_chunk_safe, chunk): i for i, chunk in enumerate(chunks)}
-        completed = 0
-        for future in as_completed(futures):
-            i = futures[future]
-            try:
-                summaries[i] = future.result()
-            except Exception as e:
-                summaries[i] = "[Error]"
-            completed += 1
-            progress_bar.progress(completed / total)
+    if keep_ratio is not None and keep_ratio < 1.0:
+        chunks, compression = compress_chunks(chunks, STAGE_CONFIG[CHUNK_SUMMARY], keep_ratio)
+        if run_metadata is not None:
+            run_metadata.record_compression(document, compression)
+    return summarize_chunks(DocumentSummary(document, chunks), range(len(chunks)), run_metadata)
 
+def summarize_chunks(result, indices, run_metadata=None):
+    # Used for the first pass and for retrying only the failed chunks of a document
+    progress_bar = st.progress(0)
+    # Small chunks (e.g. PPTX text runs) are packed several to a request
+    run_summaries(
+        result, indices,
+        lambda chunks, deadline: summarize_pack_safe(chunks, run_metadata=run_metadata, deadline=deadline),
+        lambda chunk, deadline: summarize_chunk_safe(chunk, run_metadata=run_metadata, deadline=deadline),
+        DOCUMENT_DEADLINE_S, progress_bar.progress
+    )
     progress_bar.empty()
-    return "\n\n".join(summaries)
+    return result
 
-def generate_new_frd(existing_brd_summary, existing_frd_summary, new_brd_summary):
-    user_prompt = f"""
-EXISTING BRD SUMMARY:
-{existing_brd_summary}
+def summary_text(result, run_metadata=None):
+    summary = result.text()
+    if len(summary.split()) > REDUCE_TRIGGER_WORDS:
+        summary = reduce_summaries(summary, run_metadata)
+    return summary
 
-EXISTING FRD SUMMARY:
-{existing_frd_summary}
+def generate_new_frd(existing_brd_summary, existing_frd_summary, new_brd_summary, run_metadata=None):
+    # Reference summaries first (stable prefix), the new BRD last
+    messages = build_messages(
+        FRD_SYSTEM_PROMPT,
+        [("EXISTING BRD SUMMARY", existing_brd_summary), ("EXISTING FRD SUMMARY", existing_frd_summary)],
+        [("NEW BRD SUMMARY", new_brd_summary), ("TASK", "Please generate the NEW FRD.")]
+    )
+    response = call_llm(FINAL_GENERATION, messages, run_metadata)
+    return response.choices[0].message.content
 
-NEW BRD SUMMARY:
-{new_brd_summary}
+def complete_scenarios(system_prompt, user_prompt):
+    # The finish reason tells the scenario job whether the JSON array was cut off
+    choice = call_llm(TEST_SCENARIOS, [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]).choices[0]
+    return choice.message.content, choice.finish_reason
 
-Please generate the NEW FRD.
-"""
-    system_prompt = (
-        "You are an expert business analyst. "
-        "You are given summarized versions of an existing BRD, FRD, and a new BRD. "
-        "Your task is to create a NEW FRD based on the new BRD, maintaining structure and clarity of the existing FRD."
-    )
-    response = openai.ChatCompletion.create(
-        model=MODEL,
-        api_key=OPENAI_API_KEY,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.2,
-        max_tokens=3000
+def confirm_trace_link(requirement, section_title, section_text):
+    # FRD section first: it repeats across many borderline pairs, the requirement varies
+    messages = build_messages(
+        TRACE_SYSTEM_PROMPT,
+        [("FRD SECTION", f"{section_title}\n{section_text}")],
+        [("BRD REQUIREMENT", requirement)]
     )
-    return response.choices[0].message.content
+    response = call_llm(TRACE_CONFIRMATION, messages)
+    return response.choices[0].message.content.strip().upper().startswith("YES")
+
+def regenerate_section(messages, run_metadata=None):
+    # The finish reason tells delta mode whether the section was cut off
+    choice = call_llm(SECTION_REGENERATION, messages, run_metadata).choices[0]
+    return choice.message.content, choice.finish_reason
 
 # ----- STREAMLIT UI -----
 st.set_page_config(
@@ -397,44 +476,166 @@ if selected_topic == "Generate FRD":
     
     with col2:
         new_brd_file = st.file_uploader("Upload New BRD (.docx)", type="docx", key="new_brd")
-    
-    if st.button("✨ Generate New FRD", type="primary"):
+        delta_mode = st.checkbox(
+            "Delta mode: the new BRD amends the existing BRD",
+            help="Only FRD sections driven by changed BRD sections are regenerated; the rest is copied verbatim."
+        )
+        precompress = st.checkbox(
+            "Pre-compress chunks locally before summarizing",
+            help="Keeps the most salient sentences of each chunk; requirement sentences (IDs, shall, must) are always kept."
+        )
+        keep_ratio = st.slider("Fraction of sentences to keep", 0.2, 1.0, EXTRACTIVE_KEEP_RATIO, 0.05) if precompress else None
+    
+    col1, col2 = st.columns([1, 4])
+    with col1:
+        generate_clicked = st.button("✨ Generate New FRD", type="primary")
+    with col2:
+        dry_run_clicked = st.button("🔍 Estimate (dry run)")
+
+    if dry_run_clicked:
         if not existing_brd_file or not existing_frd_file:
             st.error("❌ Please upload both Existing BRD and Existing FRD.")
         else:
-            with st.spinner("Reading and summarizing documents..."):
-                if existing_brd_file.name.endswith(".pptx"):
-                    paragraphs_brd = read_pptx(existing_brd_file)
-                else:
-                    paragraphs_brd = read_docx(existing_brd_file)
+            # Same parsing and chunking as a real run, but no LLM calls
+            dry_run_documents = {"existing_brd": existing_brd_file, "existing_frd": existing_frd_file}
+            if new_brd_file:
+                dry_run_documents["new_brd"] = new_brd_file
+            plan = plan_frd_run(
+                {name: chunk_paragraphs(paragraphs) for name, paragraphs in parse_documents(dry_run_documents).items()},
+                STAGE_CONFIG, SUMMARY_WORKERS, APP_PIPELINE,
+                system_prompts={CHUNK_SUMMARY: SUMMARY_SYSTEM_PROMPT, REDUCE: REDUCE_SYSTEM_PROMPT, FINAL_GENERATION: FRD_SYSTEM_PROMPT},
+                reduce_trigger_words=REDUCE_TRIGGER_WORDS
+            )
+            total = plan["total"]
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("LLM calls", total["calls"])
+            m2.metric("Tokens (prompt / completion)", f"{total['prompt_tokens']:,} / {total['completion_tokens']:,}")
+            m3.metric("Expected time", f"{total['wall_s'] / 60:.1f} min")
+            m4.metric("Estimated cost", "n/a" if total["cost_usd"] is None else f"${total['cost_usd']:.2f}")
+            st.dataframe(plan_rows(plan), use_container_width=True)
+            if not plan["calibrated_stages"]:
+                st.caption("No run history yet: timings use default latency assumptions.")
 
-                paragraphs_frd = read_docx(existing_frd_file)
-                paragraphs_new_brd = read_docx(new_brd_file) if new_brd_file else []
+    def show_generated_frd(new_frd_text, run_metadata, delta_report=None):
+        st.session_state.new_frd_text = new_frd_text
 
-                summary_brd = summarize_document(paragraphs_brd)
-                summary_frd = summarize_document(paragraphs_frd)
-                summary_new_brd = summarize_document(paragraphs_new_brd) if new_brd_file else "No new BRD provided."
+        st.markdown("""
+        <div class="success-box fade-in">
+            <h3 style="color: white; margin: 0;">✅ FRD Generated Successfully!</h3>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            st.download_button(
+                "📥 Download New FRD", 
+                new_frd_text, 
+                file_name="new_frd.txt", 
+                mime="text/plain",
+                type="primary"
+            )
+        with col2:
+            st.text_area("Preview of Generated FRD", new_frd_text, height=300, label_visibility="collapsed")
 
-            with st.spinner("Generating NEW FRD..."):
-                new_frd_text = generate_new_frd(summary_brd, summary_frd, summary_new_brd)
+        if delta_report is not None:
+            changed = sum(row["action"] in (REGENERATED, ADDED) for row in delta_report)
+            st.info(f"Delta mode: {changed} of {len(delta_report)} FRD sections regenerated or added, the rest copied verbatim.")
+            truncated = sum(row["action"] in (TRUNCATED, EMPTY, NOT_ADDED) for row in delta_report)
+            if truncated:
+                st.warning(f"⚠️ {truncated} sections came back cut off at the output token limit or empty and were left unchanged. Review them by hand.")
+            with st.expander("Delta details (per FRD section)"):
+                st.dataframe(delta_report, use_container_width=True)
 
-            st.markdown("""
-            <div class="success-box fade-in">
-                <h3 style="color: white; margin: 0;">✅ FRD Generated Successfully!</h3>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            col1, col2 = st.columns([1, 3])
+        append_run_history(run_metadata)
+        with st.expander("Run details (model and latency per stage)"):
+            st.json(run_metadata.by_stage())
+            if run_metadata.compression:
+                st.caption("Extractive pre-compression per document")
+                st.dataframe([{"document": name, **stats} for name, stats in run_metadata.compression.items()],
+                             use_container_width=True)
+            st.caption("Latency and hedging across all runs on this server")
+            st.json(latency_tracker.stats())
+            executor_stats = llm_executor.stats()
+            st.caption(f"Shared LLM executor: {executor_stats['running']} running, {executor_stats['queue_depth']} queued "
+                       f"(cap {executor_stats['max_concurrency']}); this session's queue wait:")
+            st.json(executor_stats["sessions"].get(current_session_id(), {}))
+
+    if generate_clicked:
+        if not existing_brd_file or not existing_frd_file:
+            st.error("❌ Please upload both Existing BRD and Existing FRD.")
+        elif delta_mode and not new_brd_file:
+            st.error("❌ Delta mode needs the New BRD.")
+        else:
+            run_metadata = RunMetadata()
+            st.session_state.pop("pending_summaries", None)
+            # Parsed concurrently, and not at all when the same files were parsed before
+            parsed = parse_documents({"existing_brd": existing_brd_file, "existing_frd": existing_frd_file, "new_brd": new_brd_file})
+            paragraphs_brd = parsed["existing_brd"]
+            paragraphs_frd = parsed["existing_frd"]
+            paragraphs_new_brd = parsed["new_brd"] or []
+
+            if delta_mode:
+                with st.spinner("Regenerating the FRD sections affected by the BRD changes..."):
+                    try:
+                        new_frd_text, delta_report = generate_delta_frd(
+                            paragraphs_brd, paragraphs_frd, paragraphs_new_brd,
+                            lambda messages: regenerate_section(messages, run_metadata)
+                        )
+                    except Exception as e:
+                        st.error(f"❌ Failed to regenerate the FRD sections: {e}")
+                        new_frd_text = None
+                if new_frd_text is not None:
+                    show_generated_frd(new_frd_text, run_metadata, delta_report)
+            else:
+                with st.spinner("Reading and summarizing documents..."):
+                    document_summaries = {
+                        "existing_brd": summarize_document(paragraphs_brd, run_metadata, keep_ratio, "existing_brd"),
+                        "existing_frd": summarize_document(paragraphs_frd, run_metadata, keep_ratio, "existing_frd"),
+                    }
+                    if new_brd_file:
+                        document_summaries["new_brd"] = summarize_document(paragraphs_new_brd, run_metadata, keep_ratio, "new_brd")
+                # Kept across reruns so failed chunks can be retried without redoing the rest
+                st.session_state.pending_summaries = (document_summaries, run_metadata)
+
+    if "pending_summaries" in st.session_state:
+        document_summaries, run_metadata = st.session_state.pending_summaries
+        failed, total, blocked = failure_summary(document_summaries.values())
+        generate_now = failed == 0
+        if failed:
+            if blocked:
+                st.error(f"❌ {failed} of {total} chunks could not be summarized, above the {MAX_FAILED_CHUNK_RATIO:.0%} limit. "
+                         "Retry the failed chunks before generating the FRD.")
+            else:
+                st.warning(f"⚠️ {failed} of {total} chunks could not be summarized. "
+                           "You can retry them, or generate the FRD with those chunks missing.")
+            st.dataframe([row for summary in document_summaries.values() for row in summary.failure_rows()],
+                         use_container_width=True)
+            col1, col2 = st.columns([1, 4])
             with col1:
-                st.download_button(
-                    "📥 Download New FRD", 
-                    new_frd_text, 
-                    file_name="new_frd.txt", 
-                    mime="text/plain",
-                    type="primary"
-                )
+                retry_clicked = st.button("🔁 Retry failed chunks", type="primary")
             with col2:
-                st.text_area("Preview of Generated FRD", new_frd_text, height=300, label_visibility="collapsed")
+                generate_now = st.button("Generate with missing chunks", disabled=blocked)
+            if retry_clicked:
+                with st.spinner(f"Re-summarizing {failed} failed chunks..."):
+                    for summary in document_summaries.values():
+                        summarize_chunks(summary, summary.failed(), run_metadata)
+                st.rerun()
+
+        if generate_now:
+            del st.session_state.pending_summaries
+            with st.spinner("Generating NEW FRD..."):
+                try:
+                    new_frd_text = generate_new_frd(
+                        summary_text(document_summaries["existing_brd"], run_metadata),
+                        summary_text(document_summaries["existing_frd"], run_metadata),
+                        summary_text(document_summaries["new_brd"], run_metadata) if "new_brd" in document_summaries else "No new BRD provided.",
+                        run_metadata
+                    )
+                except Exception as e:
+                    st.error(f"❌ Failed to generate the FRD: {e}")
+                    new_frd_text = None
+            if new_frd_text is not None:
+                show_generated_frd(new_frd_text, run_metadata)
 
 elif selected_topic == "Generate Test Scenario":
     st.markdown(f"""
@@ -443,13 +644,67 @@ elif selected_topic == "Generate Test Scenario":
         <p>Automatically create comprehensive test scenarios from your requirements documents.</p>
     </div>
     """, unsafe_allow_html=True)
-    
-    st.markdown("""
-    <div class="coming-soon fade-in">
-        <h3>🚧 Coming Soon!</h3>
-        <p>We're working hard to bring you this feature in our next release.</p>
-    </div>
-    """, unsafe_allow_html=True)
+
+    scenario_frd_file = st.file_uploader("Upload FRD (.docx)", type="docx", key="scenario_frd")
+    if scenario_frd_file:
+        frd_paragraphs = parse_document(scenario_frd_file)
+    elif st.session_state.get("new_frd_text"):
+        frd_paragraphs = [line.strip() for line in st.session_state.new_frd_text.splitlines() if line.strip()]
+        st.info("Using the FRD generated in this session.")
+    else:
+        frd_paragraphs = []
+
+    scenario_job = st.session_state.get("scenario_job")
+    running = scenario_job is not None and not scenario_job.done
+    if st.button("🧪 Generate Test Scenarios", type="primary", disabled=running):
+        if not frd_paragraphs:
+            st.error("❌ Please upload an FRD or generate one first.")
+        else:
+            if scenario_job is not None:
+                scenario_job.close()
+            # One call per FRD section, run in the background so partial results can be downloaded
+            scenario_job = ScenarioJob(split_frd_sections(frd_paragraphs), complete_scenarios)
+            st.session_state.scenario_job = scenario_job
+
+    if scenario_job is not None:
+        st.progress(
+            scenario_job.sections_done / max(scenario_job.sections_total, 1),
+            text=f"{scenario_job.row_count} scenarios from {scenario_job.sections_done}/{scenario_job.sections_total} FRD sections"
+        )
+        if scenario_job.error:
+            st.error(f"❌ Scenario generation stopped: {scenario_job.error}")
+        if scenario_job.issues:
+            st.warning(f"⚠️ {len(scenario_job.issues)} FRD sections are missing some or all of their scenarios.")
+            st.dataframe(scenario_job.issues, use_container_width=True)
+        # The .xlsx is written to a temp file only when asked for, or once when the job is done
+        export = scenario_job.spool.export
+        if scenario_job.done and (export is None or export[0] != scenario_job.row_count):
+            export = scenario_job.spool.export_xlsx()
+        elif not scenario_job.done and st.button("📦 Prepare partial download"):
+            export = scenario_job.spool.export_xlsx()
+        if export is not None:
+            with open(export[1], "rb") as xlsx:
+                downloaded = st.download_button(
+                    "📥 Download Test Scenarios (.xlsx)" if scenario_job.done else f"📥 Download Partial Results ({export[0]} scenarios, .xlsx)",
+                    xlsx,
+                    file_name="test_scenarios.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    type="primary"
+                )
+            if downloaded and not scenario_job.done:
+                scenario_job.spool.discard_export()
+                export = None
+            elif not scenario_job.done:
+                st.caption("Progress updates pause until the partial results are downloaded.")
+        if scenario_job.recent:
+            st.dataframe(
+                [{"FRD Section": section, "Scenario": title} for section, title in scenario_job.recent],
+                use_container_width=True
+            )
+        # Polling stops while a partial download is on offer, so its file isn't re-sent every rerun
+        if not scenario_job.done and export is None:
+            time.sleep(2)
+            st.rerun()
     
 elif selected_topic == "Generate Mockup":
     st.markdown(f"""
@@ -473,13 +728,48 @@ elif selected_topic == "Generate Excel File":
         <p>Create detailed Excel reports from your business documents.</p>
     </div>
     """, unsafe_allow_html=True)
-    
-    st.markdown("""
-    <div class="coming-soon fade-in">
-        <h3>🚧 Coming Soon!</h3>
-        <p>We're working hard to bring you this feature in our next release.</p>
-    </div>
-    """, unsafe_allow_html=True)
+
+    st.subheader("Requirements Traceability Matrix")
+    col1, col2 = st.columns(2)
+    with col1:
+        trace_brd_file = st.file_uploader("Upload New BRD (.docx or .pptx)", type=["docx", "pptx"], key="trace_brd")
+        trace_reference_frd_file = st.file_uploader("Upload Reference FRD (.docx, optional)", type="docx", key="trace_reference_frd")
+    with col2:
+        trace_frd_file = st.file_uploader("Upload Generated FRD (.docx)", type="docx", key="trace_frd")
+        if not trace_frd_file and st.session_state.get("new_frd_text"):
+            st.info("Using the FRD generated in this session.")
+        confirm_borderline = st.checkbox("Confirm borderline links with the LLM", value=True)
+
+    if st.button("📊 Build Traceability Matrix", type="primary"):
+        if trace_frd_file:
+            trace_frd_paragraphs = parse_document(trace_frd_file)
+        else:
+            trace_frd_paragraphs = [line.strip() for line in st.session_state.get("new_frd_text", "").splitlines() if line.strip()]
+        if not trace_brd_file or not trace_frd_paragraphs:
+            st.error("❌ Please upload the new BRD and a generated FRD (or generate one first).")
+        else:
+            with st.spinner("Matching requirements to FRD sections..."):
+                start = time.perf_counter()
+                parsed = parse_documents({"brd": trace_brd_file, "reference_frd": trace_reference_frd_file})
+                trace_brd_paragraphs, trace_reference_paragraphs = parsed["brd"], parsed["reference_frd"]
+                trace_result = build_traceability(
+                    trace_brd_paragraphs, trace_frd_paragraphs, trace_reference_paragraphs,
+                    confirm=confirm_trace_link if confirm_borderline else None
+                )
+                elapsed = time.perf_counter() - start
+
+            statuses = [row["status"] for row in trace_result["rows"]]
+            st.success(
+                f"✅ {len(trace_result['requirements'])} requirements x {len(trace_result['sections'])} FRD sections in {elapsed:.1f}s"
+            )
+            st.write({status: statuses.count(status) for status in sorted(set(statuses))})
+            st.download_button(
+                "📥 Download Traceability Matrix (.xlsx)",
+                traceability_to_xlsx(trace_result),
+                file_name="traceability_matrix.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                type="primary"
+            )
 
 # Footer with animation
 st.markdown("""
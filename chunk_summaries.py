@@ -0,0 +1,135 @@
+# chunk_summaries.py
+#
+# Per-chunk results of summarizing one document, so a run can report which chunks
+# failed and re-summarize only those instead of the whole document.
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from llm_executor import current_session_id, llm_executor
+from request_packing import plan_packs
+
+CHUNK_PENDING = "pending"
+CHUNK_OK = "ok"
+CHUNK_FAILED = "failed"
+CHUNK_TIMED_OUT = "timed_out"
+
+# Above this share of failed chunks (over all documents of a run) generation is blocked
+# until the failed chunks are retried; below it the user is warned and may continue
+MAX_FAILED_CHUNK_RATIO = float(os.getenv("FRD_MAX_FAILED_CHUNK_RATIO", "0.05"))
+MISSING_SUMMARY = "[Summary unavailable for chunk {n}]"
+PREVIEW_CHARS = 160
+
+
+class DocumentSummary:
+    def __init__(self, document, chunks):
+        self.document = document
+        self.chunks = chunks
+        self.summaries = [None] * len(chunks)
+        self.statuses = [CHUNK_PENDING] * len(chunks)
+        self.errors = [""] * len(chunks)
+        self.attempts = [0] * len(chunks)
+
+    def set_result(self, i, summary, status=CHUNK_OK, error=""):
+        self.attempts[i] += 1
+        if summary is None and status == CHUNK_OK:
+            status, error = CHUNK_FAILED, error or "retries exhausted"
+        self.summaries[i] = summary
+        self.statuses[i] = status
+        self.errors[i] = error
+
+    def failed(self):
+        return [i for i, status in enumerate(self.statuses) if status != CHUNK_OK]
+
+    def text(self, separator="\n\n"):
+        # Failed chunks leave a visible gap rather than an error string the LLM would summarize
+        return separator.join(
+            summary if status == CHUNK_OK else MISSING_SUMMARY.format(n=i + 1)
+            for i, (summary, status) in enumerate(zip(self.summaries, self.statuses))
+        )
+
+    def failure_rows(self):
+        return [
+            {
+                "document": self.document,
+                "chunk": i + 1,
+                "status": self.statuses[i],
+                "attempts": self.attempts[i],
+                "error": self.errors[i],
+                "preview": self.chunks[i][:PREVIEW_CHARS],
+            }
+            for i in self.failed()
+        ]
+
+
+def failure_summary(document_summaries):
+    # (failed chunks, total chunks, blocked) over all documents of a run
+    failed = sum(len(summary.failed()) for summary in document_summaries)
+    total = sum(len(summary.chunks) for summary in document_summaries)
+    return failed, total, bool(total) and failed / total > MAX_FAILED_CHUNK_RATIO
+
+
+def run_summaries(result, indices, summarize_pack, summarize_one, deadline_s, on_progress=None):
+    # summarize_pack(chunks, deadline) -> [summary or None, ...] for packs of small chunks,
+    # summarize_one(chunk, deadline) -> summary or None for everything else. Segments a pack
+    # couldn't produce go back to the shared LLM executor as single calls rather than being
+    # retried in the pack's slot. Anything still running at the deadline is marked as timed out
+    indices = list(indices)
+    if not indices:
+        return result
+    deadline = time.monotonic() + deadline_s
+    session_id = current_session_id()
+    futures = {}
+
+    def submit_one(i):
+        future = llm_executor.submit(session_id, summarize_one, result.chunks[i], deadline)
+        futures[future] = ([i], False)
+        return future
+
+    pending = set()
+    for pack in plan_packs([result.chunks[i] for i in indices]):
+        pack = [indices[j] for j in pack]
+        if len(pack) == 1:
+            pending.add(submit_one(pack[0]))
+        else:
+            future = llm_executor.submit(session_id, summarize_pack, [result.chunks[i] for i in pack], deadline)
+            futures[future] = (pack, True)
+            pending.add(future)
+
+    completed = 0
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                # A straggler must not hold up the whole document past its deadline
+                for future in pending:
+                    for i in futures[future][0]:
+                        result.set_result(i, None, CHUNK_TIMED_OUT, "document deadline exceeded")
+                break
+            for future in done:
+                pack, packed = futures[future]
+                if not packed:
+                    try:
+                        result.set_result(pack[0], future.result())
+                    except Exception as e:
+                        result.set_result(pack[0], None, CHUNK_FAILED, str(e))
+                    completed += 1
+                    continue
+                try:
+                    summaries = future.result()
+                except Exception:
+                    summaries = [None] * len(pack)
+                for i, summary in zip(pack, summaries):
+                    if summary is None:
+                        pending.add(submit_one(i))
+                    else:
+                        result.set_result(i, summary)
+                        completed += 1
+            if on_progress is not None:
+                on_progress(completed / len(indices))
+    finally:
+        # Give this session's queued slots back to everyone else
+        for future in futures:
+            future.cancel()
+    return result
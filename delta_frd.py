@@ -0,0 +1,211 @@
+# delta_frd.py
+#
+# Delta FRD generation for BRD amendments: the new BRD is aligned with the existing BRD
+# section by section, changed BRD sections are mapped to the existing FRD sections they
+# drive, and only those FRD sections are regenerated. Everything else is copied verbatim.
+
+import re
+from difflib import SequenceMatcher
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from documents import is_heading
+from llm_executor import current_session_id, llm_executor
+from prompt_layout import build_messages
+from traceability import similarity_matrix
+
+# Sections whose line-level similarity is at least this are treated as unchanged
+UNCHANGED_RATIO = 0.98
+# Minimum content similarity to pair an old and a new BRD section whose titles differ
+ALIGN_THRESHOLD = 0.3
+# An FRD section is driven by a changed BRD section above this similarity (the best
+# match is always included)
+DRIVE_THRESHOLD = 0.2
+
+KEPT = "Kept verbatim"
+REGENERATED = "Regenerated"
+ADDED = "Added"
+# The model ran out of tokens or returned nothing: the original section is kept rather
+# than a cut-off or blank rewrite
+TRUNCATED = "Kept verbatim (regeneration truncated)"
+EMPTY = "Kept verbatim (regeneration empty)"
+NOT_ADDED = "Not added (generation truncated or empty)"
+
+DELTA_SYSTEM_PROMPT = (
+    "You are an expert business analyst updating one section of a signed-off FRD after a BRD amendment. "
+    "Change only what the BRD changes require and keep all other wording, numbering and formatting exactly as it is. "
+    "Return only the complete updated section, starting with its heading."
+)
+NEW_SECTION_SYSTEM_PROMPT = (
+    "You are an expert business analyst. Write a new FRD section for a requirement added to the BRD, "
+    "matching the structure, numbering style and tone of the existing FRD. "
+    "Return only the new section, starting with its heading."
+)
+
+
+def split_sections(paragraphs):
+    # (heading or None, [body paragraphs]); text before the first heading has no heading
+    sections, heading, body = [], None, []
+    for para in paragraphs:
+        if is_heading(para):
+            if heading is not None or body:
+                sections.append((heading, body))
+            heading, body = para.strip(), []
+        else:
+            body.append(para)
+    if heading is not None or body:
+        sections.append((heading, body))
+    return sections
+
+
+def section_text(section):
+    heading, body = section
+    return "\n".join(([heading] if heading else []) + body)
+
+
+def normalize_title(heading):
+    return re.sub(r"^[\d.\s]+", "", heading or "").strip(" :-").lower()
+
+
+def align_sections(old_sections, new_sections, vectorizer):
+    # Returns (old_index or None, new_index or None) pairs: same title first, then content
+    pairs, old_left, new_left = [], set(range(len(old_sections))), set(range(len(new_sections)))
+    old_by_title = {}
+    for i, (heading, _) in enumerate(old_sections):
+        old_by_title.setdefault(normalize_title(heading), []).append(i)
+    for j, (heading, _) in enumerate(new_sections):
+        candidates = [i for i in old_by_title.get(normalize_title(heading), []) if i in old_left]
+        if candidates:
+            pairs.append((candidates[0], j))
+            old_left.discard(candidates[0])
+            new_left.discard(j)
+
+    if old_left and new_left:
+        old_ids, new_ids = sorted(old_left), sorted(new_left)
+        scores = similarity_matrix(
+            vectorizer,
+            [(j, section_text(new_sections[j])) for j in new_ids],
+            [(old_sections[i][0] or "", "\n".join(old_sections[i][1])) for i in old_ids],
+        )
+        # Greedy: best remaining pair first
+        for flat in np.argsort(-scores, axis=None):
+            row, col = divmod(int(flat), len(old_ids))
+            if scores[row, col] < ALIGN_THRESHOLD:
+                break
+            j, i = new_ids[row], old_ids[col]
+            if j in new_left and i in old_left:
+                pairs.append((i, j))
+                new_left.discard(j)
+                old_left.discard(i)
+
+    pairs += [(i, None) for i in sorted(old_left)] + [(None, j) for j in sorted(new_left)]
+    return pairs
+
+
+def diff_brd(old_sections, new_sections, vectorizer):
+    # Changes as dicts: kind is "changed", "added" or "removed"
+    changes = []
+    for i, j in align_sections(old_sections, new_sections, vectorizer):
+        if i is None:
+            changes.append({"kind": "added", "before": "", "after": section_text(new_sections[j])})
+        elif j is None:
+            changes.append({"kind": "removed", "before": section_text(old_sections[i]), "after": ""})
+        else:
+            before, after = section_text(old_sections[i]), section_text(new_sections[j])
+            if SequenceMatcher(None, before.splitlines(), after.splitlines()).ratio() < UNCHANGED_RATIO:
+                changes.append({"kind": "changed", "before": before, "after": after})
+    return changes
+
+
+def describe_changes(changes):
+    parts = []
+    for change in changes:
+        if change["kind"] == "changed":
+            parts.append(f"CHANGED BRD SECTION\nBEFORE:\n{change['before']}\nAFTER:\n{change['after']}")
+        elif change["kind"] == "added":
+            parts.append(f"ADDED BRD SECTION\n{change['after']}")
+        else:
+            parts.append(f"REMOVED BRD SECTION\n{change['before']}")
+    return "\n\n".join(parts)
+
+
+def unusable(text, finish_reason):
+    # The report action for output that can't replace a section, or None if it can
+    if finish_reason == "length":
+        return TRUNCATED
+    return None if (text or "").strip() else EMPTY
+
+
+def generate_delta_frd(existing_brd_paragraphs, existing_frd_paragraphs, new_brd_paragraphs, complete):
+    # complete(messages) -> (text, finish_reason). Returns (new FRD text, report rows)
+    old_brd, new_brd = split_sections(existing_brd_paragraphs), split_sections(new_brd_paragraphs)
+    frd = split_sections(existing_frd_paragraphs)
+    frd_texts = [section_text(section) for section in frd]
+
+    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True, ngram_range=(1, 2))
+    vectorizer.fit([section_text(s) for s in old_brd + new_brd] + frd_texts)
+    changes = diff_brd(old_brd, new_brd, vectorizer)
+
+    # Which FRD sections each change drives; added sections with no home become new FRD sections
+    driven, new_sections = {}, []
+    if changes and frd:
+        scores = similarity_matrix(
+            vectorizer,
+            [(n, f"{change['before']}\n{change['after']}") for n, change in enumerate(changes)],
+            [(section[0] or "", "\n".join(section[1])) for section in frd],
+        )
+        for n, change in enumerate(changes):
+            best = int(scores[n].argmax())
+            if change["kind"] == "added" and scores[n, best] < DRIVE_THRESHOLD:
+                new_sections.append(change)
+                continue
+            for k in set(np.flatnonzero(scores[n] >= DRIVE_THRESHOLD).tolist()) | {best}:
+                driven.setdefault(k, []).append(change)
+
+    def regenerate(k):
+        messages = build_messages(
+            DELTA_SYSTEM_PROMPT,
+            [("EXISTING FRD SECTION", frd_texts[k])],
+            [("BRD CHANGES", describe_changes(driven[k]))],
+        )
+        return complete(messages)
+
+    def write_new(change):
+        messages = build_messages(
+            NEW_SECTION_SYSTEM_PROMPT,
+            [("EXISTING FRD STRUCTURE", "\n".join(section[0] for section in frd if section[0]))],
+            [("ADDED BRD SECTION", change["after"])],
+        )
+        return complete(messages)
+
+    session_id = current_session_id()
+    futures = [llm_executor.submit(session_id, regenerate, k) for k in sorted(driven)]
+    futures += [llm_executor.submit(session_id, write_new, change) for change in new_sections]
+    try:
+        results = [future.result() for future in futures]
+    finally:
+        # A failed call gives this session's queued slots back to everyone else
+        for future in futures:
+            future.cancel()
+    regenerated, added = dict(zip(sorted(driven), results)), results[len(driven):]
+
+    output, report = [], []
+    for k, section in enumerate(frd):
+        title = section[0] or "(preamble)"
+        problem = unusable(*regenerated[k]) if k in regenerated else KEPT
+        if problem is None:
+            output.append(regenerated[k][0].strip())
+            report.append({"frd_section": title, "action": REGENERATED, "brd_changes": len(driven[k])})
+        else:
+            output.append(frd_texts[k])
+            report.append({"frd_section": title, "action": problem, "brd_changes": len(driven.get(k, []))})
+    for change, (text, finish_reason) in zip(new_sections, added):
+        if unusable(text, finish_reason) is not None:
+            report.append({"frd_section": change["after"].splitlines()[0] if change["after"] else "(new section)",
+                           "action": NOT_ADDED, "brd_changes": 1})
+            continue
+        output.append(text.strip())
+        report.append({"frd_section": text.strip().splitlines()[0] if text.strip() else "(new section)",
+                       "action": ADDED, "brd_changes": 1})
+    return "\n\n".join(output), report
@@ -0,0 +1,105 @@
+# document_store.py
+
+import os
+import tempfile
+import threading
+import weakref
+import zlib
+from functools import lru_cache
+
+from documents import read_docx
+
+# Texts up to this size stay as plain strings; larger ones are zlib-compressed
+INLINE_MAX_BYTES = 32 * 1024
+# Compressed texts above this size go to a temp file and are read back on access
+SPILL_MIN_BYTES = int(os.getenv("FRD_DOCUMENT_SPILL_BYTES", str(256 * 1024)))
+COMPRESSION_LEVEL = 6
+
+
+class DocumentStore:
+    # Large document texts for one Streamlit session, kept once and compact: small texts
+    # inline, large ones compressed, the largest spilled to disk. Texts are decompressed
+    # on access; temp files go when the store is closed or its session is dropped.
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._paths = set()
+        self._finalizer = weakref.finalize(self, _remove_files, self._paths)
+
+    def put(self, name, text):
+        data = text.encode("utf-8")
+        if len(data) <= INLINE_MAX_BYTES:
+            entry = ("inline", text)
+        else:
+            compressed = zlib.compress(data, COMPRESSION_LEVEL)
+            if len(compressed) < SPILL_MIN_BYTES:
+                entry = ("compressed", compressed)
+            else:
+                handle, path = tempfile.mkstemp(prefix="frd_document_", suffix=".z")
+                with os.fdopen(handle, "wb") as spill:
+                    spill.write(compressed)
+                entry = ("spilled", path)
+        with self._lock:
+            previous = self._entries.get(name)
+            self._entries[name] = entry
+            if entry[0] == "spilled":
+                self._paths.add(entry[1])
+        self._discard(previous)
+
+    def get(self, name, default=""):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            return default
+        kind, value = entry
+        if kind == "inline":
+            return value
+        if kind == "spilled":
+            with open(value, "rb") as spill:
+                value = spill.read()
+        return zlib.decompress(value).decode("utf-8")
+
+    def pop(self, name):
+        with self._lock:
+            previous = self._entries.pop(name, None)
+        self._discard(previous)
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._entries
+
+    def resident_bytes(self):
+        # Memory held by the store itself; spilled texts only count their path
+        with self._lock:
+            entries = list(self._entries.values())
+        return sum(len(value) if kind != "inline" else len(value.encode("utf-8")) for kind, value in entries)
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+        self._finalizer()
+
+    def _discard(self, entry):
+        if entry is not None and entry[0] == "spilled":
+            with self._lock:
+                self._paths.discard(entry[1])
+            if os.path.exists(entry[1]):
+                os.remove(entry[1])
+
+
+def _remove_files(paths):
+    for path in list(paths):
+        if os.path.exists(path):
+            os.remove(path)
+    paths.clear()
+
+
+@lru_cache(maxsize=8)
+def _reference_text(path, mtime):
+    return "\n\n".join(read_docx(path))
+
+
+def reference_text(path):
+    # Pre-loaded reference documents are the same for every session: parse and join them
+    # once per process, and again only when the file changes
+    return _reference_text(str(path), os.path.getmtime(path))
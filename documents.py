@@ -0,0 +1,205 @@
+# documents.py
+
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from docx import Document
+from pptx import Presentation
+
+MAX_TOKENS_PER_CHUNK = 2000
+MAX_CHARS_PER_CHUNK = 1500
+# Parsed uploads kept per process, evicted least recently used first
+PARSE_CACHE_ENTRIES = 32
+PARSE_CACHE_MAX_CHARS = 50_000_000
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+# Word styles whose paragraphs are section headings
+HEADING_STYLE = re.compile(r"^(Heading \d+|Title)$")
+HEADING_PATTERN = re.compile(r"^(\d+(\.\d+)*\.?|[A-Z][A-Z0-9 &/-]{3,})\s*\S*")
+
+
+class Heading(str):
+    # A paragraph styled as a heading in the source document, so section splitting
+    # doesn't have to guess from numbering or capitals
+    __slots__ = ()
+
+
+def is_heading(paragraph):
+    # Styled as a heading in the document, or else numbered ("3.2 Order Entry") or all-caps
+    # lines that are short and don't end a sentence
+    text = paragraph.strip()
+    if isinstance(paragraph, Heading):
+        return bool(text)
+    if not text or len(text.split()) > 12 or text.endswith((".", ":", ";", ",")):
+        return False
+    return bool(HEADING_PATTERN.match(text)) and (text[0].isdigit() or text.isupper())
+
+
+def read_docx(uploaded_file):
+    doc = Document(uploaded_file)
+    return [
+        Heading(para.text.strip()) if HEADING_STYLE.match(getattr(para.style, "name", None) or "") else para.text.strip()
+        for para in doc.paragraphs if para.text.strip()
+    ]
+
+
+def read_pptx(uploaded_file):
+    prs = Presentation(uploaded_file)
+    text_runs = []
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text = shape.text.strip()
+                if text:
+                    text_runs.append(text)
+    return text_runs
+
+
+def read_document(uploaded_file):
+    return read_pptx(uploaded_file) if uploaded_file.name.endswith(".pptx") else read_docx(uploaded_file)
+
+
+# Word-count chunking used by app.py and t1.py
+def chunk_paragraphs(paragraphs, max_tokens=MAX_TOKENS_PER_CHUNK):
+    chunks, current_chunk, current_tokens = [], [], 0
+    for para in paragraphs:
+        tokens = len(para.split())
+        if current_tokens + tokens > max_tokens:
+            chunks.append("\n".join(current_chunk))
+            current_chunk, current_tokens = [para], tokens
+        else:
+            current_chunk.append(para)
+            current_tokens += tokens
+    if current_chunk:
+        chunks.append("\n".join(current_chunk))
+    return chunks
+
+
+# Character-count chunking used by main_app.py
+def chunk_text(text, max_chars=MAX_CHARS_PER_CHUNK):
+    paragraphs = text.split("\n")
+    chunks, current_chunk = [], ""
+    for para in paragraphs:
+        if len(current_chunk + para) < max_chars:
+            current_chunk += para + "\n"
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = para + "\n"
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+class ParseCache:
+    # Reruns and repeated clicks hand us the same upload bytes again; keyed by a hash of
+    # the bytes and the reader, so an unchanged file is never parsed twice
+    def __init__(self, max_entries=PARSE_CACHE_ENTRIES, max_chars=PARSE_CACHE_MAX_CHARS):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(data, reader):
+        digest = hashlib.sha256(f"{reader.__module__}.{reader.__qualname__}".encode("utf-8"))
+        digest.update(b"\x00" + data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return list(self._entries[key][0])
+
+    def put(self, key, paragraphs):
+        # Stored as a tuple so one caller can't change what the next one gets back
+        size = sum(len(para) for para in paragraphs)
+        with self._lock:
+            if key in self._entries:
+                self._chars -= self._entries.pop(key)[1]
+            self._entries[key] = (tuple(paragraphs), size)
+            self._chars += size
+            while len(self._entries) > self.max_entries or (self._chars > self.max_chars and len(self._entries) > 1):
+                self._chars -= self._entries.popitem(last=False)[1][1]
+
+
+parse_cache = ParseCache()
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _parse_bytes(data, name, reader):
+    buffer = io.BytesIO(data)
+    buffer.name = name
+    return reader(buffer)
+
+
+def _pool():
+    # Parsing is pure Python and holds the GIL, so files are parsed in separate processes.
+    # Spawned rather than forked: the Streamlit server is multi-threaded
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+def _reset_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        _parse_pool = None
+
+
+def parse_document(uploaded_file, reader=read_document):
+    data = uploaded_file.getvalue()
+    key = parse_cache.key(data, reader)
+    paragraphs = parse_cache.get(key)
+    if paragraphs is None:
+        paragraphs = _parse_bytes(data, uploaded_file.name, reader)
+        parse_cache.put(key, paragraphs)
+    return paragraphs
+
+
+def parse_documents(uploaded_files, reader=read_document):
+    # {name: uploaded file or None} -> {name: paragraphs or None}. Files not in the cache are
+    # parsed at once, so a cold start costs about the slowest file and a warm one nothing.
+    # reader must be a module-level function so it can be sent to the worker processes
+    parsed, misses = {}, {}
+    for name, uploaded_file in uploaded_files.items():
+        if uploaded_file is None:
+            parsed[name] = None
+            continue
+        data = uploaded_file.getvalue()
+        key = parse_cache.key(data, reader)
+        parsed[name] = parse_cache.get(key)
+        if parsed[name] is None:
+            misses[name] = (key, data, uploaded_file.name)
+
+    # One file, or one CPU: a worker process would only add overhead
+    if len(misses) < 2 or PARSE_WORKERS < 2:
+        futures = {}
+    else:
+        futures = {name: _pool().submit(_parse_bytes, data, file_name, reader)
+                   for name, (_, data, file_name) in misses.items()}
+    for name, (key, data, file_name) in misses.items():
+        try:
+            paragraphs = futures[name].result() if name in futures else _parse_bytes(data, file_name, reader)
+        except BrokenProcessPool:
+            # A crashed worker takes the pool down; parse here and start a fresh pool next time
+            _reset_pool()
+            paragraphs = _parse_bytes(data, file_name, reader)
+        parse_cache.put(key, paragraphs)
+        parsed[name] = paragraphs
+    return parsed
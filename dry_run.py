@@ -0,0 +1,194 @@
+# dry_run.py
+#
+# Estimates what "Generate New FRD" will cost before running it: LLM calls, prompt and
+# completion tokens, wall time at the configured concurrency and dollar cost per stage.
+# Documents are parsed and chunked with the real chunking code; latency and output size
+# are calibrated from the run history written by previous runs.
+#
+#   python dry_run.py --existing-brd brd.docx --existing-frd frd.docx --new-brd new_brd.docx
+
+import argparse
+import heapq
+
+from documents import MAX_TOKENS_PER_CHUNK, chunk_paragraphs, chunk_text, read_docx, read_pptx
+from llm_executor import LLM_CONCURRENCY
+from request_packing import PACKED_SUMMARY_SYSTEM_PROMPT, packed_max_tokens, plan_packs
+from llm_stages import (
+    CHUNK_SUMMARY, REDUCE, PATTERN_EXTRACTION, FINAL_GENERATION, REDUCE_TRIGGER_WORDS,
+    StageCalibration, build_stage_config, count_tokens, load_run_history,
+)
+
+# USD per 1M (prompt, completion) tokens; unknown models are reported without a cost
+MODEL_PRICES_PER_1M = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "o3-mini": (1.10, 4.40),
+}
+
+# Chat formatting overhead per message, and per delimited segment of a packed request
+MESSAGE_OVERHEAD_TOKENS = 4
+SEGMENT_OVERHEAD_TOKENS = 16
+
+APP_PIPELINE = [CHUNK_SUMMARY, REDUCE, FINAL_GENERATION]
+LANGGRAPH_PIPELINE = [CHUNK_SUMMARY, PATTERN_EXTRACTION, FINAL_GENERATION]
+
+
+def makespan(durations, workers):
+    # Wall time of running the durations in submission order on a pool of `workers`
+    free_at = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heapreplace(free_at, free_at[0] + duration)
+    return max(free_at)
+
+
+def cost_usd(model, prompt_tokens, completion_tokens):
+    prices = MODEL_PRICES_PER_1M.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+def plan_frd_run(chunks_by_document, stage_config, concurrency, pipeline=APP_PIPELINE,
+                 system_prompts=None, reduce_trigger_words=None, history=None):
+    # chunks_by_document: {name: [chunk, ...]} in the order the app summarizes them
+    system_prompts = system_prompts or {}
+    history = load_run_history() if history is None else history
+    calibrations = {stage: StageCalibration(stage, history) for stage in pipeline}
+    stages = {stage: {"model": stage_config[stage].model, "calls": 0, "prompt_tokens": 0,
+                      "completion_tokens": 0, "wall_s": 0.0, "cost_usd": 0.0} for stage in pipeline}
+
+    def add_call(stage, prompt_tokens, model=None, max_tokens=None):
+        config, calibration = stage_config[stage], calibrations[stage]
+        completion_tokens = calibration.completion_tokens(prompt_tokens, max_tokens or config.max_tokens)
+        entry = stages[stage]
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        cost = cost_usd(model or config.model, prompt_tokens, completion_tokens)
+        entry["cost_usd"] = None if cost is None or entry["cost_usd"] is None else entry["cost_usd"] + cost
+        return completion_tokens, calibration.latency_s(completion_tokens)
+
+    def system_tokens(stage):
+        return count_tokens(system_prompts.get(stage, ""), stage_config[stage].model) + 2 * MESSAGE_OVERHEAD_TOKENS
+
+    documents, summary_tokens = {}, {}
+    for name, chunks in chunks_by_document.items():
+        durations, doc_summary_tokens = [], 0
+        chunk_tokens = [count_tokens(chunk, stage_config[CHUNK_SUMMARY].model) for chunk in chunks]
+        # Small chunks are packed several to a request, as summarize_document does
+        for pack in plan_packs(chunks):
+            tokens = sum(chunk_tokens[i] for i in pack)
+            if len(pack) > 1:
+                prompt_tokens = (count_tokens(PACKED_SUMMARY_SYSTEM_PROMPT) + 2 * MESSAGE_OVERHEAD_TOKENS
+                                 + tokens + SEGMENT_OVERHEAD_TOKENS * len(pack))
+                completion_tokens, latency_s = add_call(CHUNK_SUMMARY, prompt_tokens, max_tokens=packed_max_tokens(len(pack)))
+                durations.append(latency_s)
+                doc_summary_tokens += completion_tokens
+                continue
+            completion_tokens, latency_s = add_call(CHUNK_SUMMARY, system_tokens(CHUNK_SUMMARY) + tokens)
+            # Expected share of chunks the cascade sends on to the larger model
+            escalation_rate = calibrations[CHUNK_SUMMARY].escalation_rate
+            escalation_model = stage_config[CHUNK_SUMMARY].escalation_model
+            if escalation_model and escalation_rate:
+                extra_cost = cost_usd(escalation_model, system_tokens(CHUNK_SUMMARY) + tokens, completion_tokens)
+                if extra_cost is not None and stages[CHUNK_SUMMARY]["cost_usd"] is not None:
+                    stages[CHUNK_SUMMARY]["cost_usd"] += escalation_rate * extra_cost
+                stages[CHUNK_SUMMARY]["calls"] += escalation_rate
+                latency_s *= 1 + escalation_rate
+            durations.append(latency_s)
+            doc_summary_tokens += completion_tokens
+        stages[CHUNK_SUMMARY]["wall_s"] += makespan(durations, concurrency)
+
+        # The app compares words, roughly 3/4 of the token count
+        if REDUCE in stages and reduce_trigger_words and doc_summary_tokens * 3 / 4 > reduce_trigger_words:
+            doc_summary_tokens, latency_s = add_call(REDUCE, system_tokens(REDUCE) + doc_summary_tokens)
+            stages[REDUCE]["wall_s"] += latency_s
+
+        summary_tokens[name] = doc_summary_tokens
+        documents[name] = {"chunks": len(chunks), "tokens": sum(chunk_tokens), "summary_tokens": doc_summary_tokens}
+
+    pattern_tokens = 0
+    if PATTERN_EXTRACTION in stages:
+        frd_summary_tokens = summary_tokens.get("existing_frd", 0)
+        pattern_tokens, latency_s = add_call(PATTERN_EXTRACTION, system_tokens(PATTERN_EXTRACTION) + 100 + frd_summary_tokens)
+        stages[PATTERN_EXTRACTION]["wall_s"] += latency_s
+
+    _, latency_s = add_call(FINAL_GENERATION, system_tokens(FINAL_GENERATION) + pattern_tokens + sum(summary_tokens.values()))
+    stages[FINAL_GENERATION]["wall_s"] += latency_s
+
+    for entry in stages.values():
+        entry["calls"] = round(entry["calls"], 1)
+        entry["wall_s"] = round(entry["wall_s"], 1)
+        if entry["cost_usd"] is not None:
+            entry["cost_usd"] = round(entry["cost_usd"], 4)
+
+    costs = [entry["cost_usd"] for entry in stages.values()]
+    total = {
+        "calls": round(sum(entry["calls"] for entry in stages.values()), 1),
+        "prompt_tokens": sum(entry["prompt_tokens"] for entry in stages.values()),
+        "completion_tokens": sum(entry["completion_tokens"] for entry in stages.values()),
+        "wall_s": round(sum(entry["wall_s"] for entry in stages.values()), 1),
+        "cost_usd": None if None in costs else round(sum(costs), 4),
+    }
+    return {
+        "documents": documents,
+        "stages": stages,
+        "total": total,
+        "concurrency": concurrency,
+        "calibrated_stages": [stage for stage, calibration in calibrations.items() if calibration.calibrated],
+    }
+
+
+def plan_rows(plan):
+    # Flat rows for st.dataframe / the CLI table
+    rows = [{"stage": stage, **entry} for stage, entry in plan["stages"].items()]
+    rows.append({"stage": "TOTAL", "model": "", **plan["total"]})
+    return rows
+
+
+def print_plan(plan):
+    print("\nDocuments:")
+    for name, info in plan["documents"].items():
+        print(f"  {name:<14} {info['chunks']:>5} chunks  {info['tokens']:>8} tokens")
+    columns = ["stage", "model", "calls", "prompt_tokens", "completion_tokens", "wall_s", "cost_usd"]
+    print(f"\nEstimate at concurrency {plan['concurrency']}:")
+    print("  ".join(f"{c:>18}" for c in columns))
+    for row in plan_rows(plan):
+        print("  ".join(f"{'n/a' if row[c] is None else row[c]!s:>18}" for c in columns))
+    calibrated = ", ".join(plan["calibrated_stages"]) or "none (using defaults)"
+    print(f"\nCalibrated from run history: {calibrated}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dry-run estimate for FRD generation")
+    parser.add_argument("--existing-brd", required=True)
+    parser.add_argument("--existing-frd", required=True)
+    parser.add_argument("--new-brd")
+    parser.add_argument("--model", default="gpt-4o", help="Large model (app.py: gpt-4o, main_app.py: gpt-4-turbo)")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY,
+                        help="Concurrent LLM calls; defaults to the apps' FRD_LLM_CONCURRENCY")
+    parser.add_argument("--pipeline", choices=["app", "langgraph"], default="app",
+                        help="app: app.py (word chunks, reduce); langgraph: main_app.py (character chunks, pattern extraction)")
+    args = parser.parse_args(argv)
+
+    def read(path):
+        return read_pptx(path) if path.endswith(".pptx") else read_docx(path)
+
+    paths = {"existing_brd": args.existing_brd, "existing_frd": args.existing_frd}
+    if args.new_brd:
+        paths["new_brd"] = args.new_brd
+    if args.pipeline == "app":
+        chunks = {name: chunk_paragraphs(read(path), MAX_TOKENS_PER_CHUNK) for name, path in paths.items()}
+        pipeline, reduce_trigger = APP_PIPELINE, REDUCE_TRIGGER_WORDS
+    else:
+        chunks = {name: chunk_text("\n".join(read(path))) for name, path in paths.items()}
+        pipeline, reduce_trigger = LANGGRAPH_PIPELINE, None
+
+    plan = plan_frd_run(chunks, build_stage_config(args.model), args.concurrency, pipeline,
+                        reduce_trigger_words=reduce_trigger)
+    print_plan(plan)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# extractive.py
+#
+# Optional local pre-compression of chunks before LLM summarization: sentences are ranked
+# with TextRank over TF-IDF cosine similarity and only the most salient fraction is sent.
+# Requirement-like sentences (IDs, "shall", "must") and the first occurrence of each
+# heading are always kept; repeated sentences such as page headers are dropped.
+
+import math
+import os
+import re
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from documents import is_heading
+from llm_stages import CHUNK_SUMMARY, REQUIREMENT_ID_PATTERN, StageCalibration, count_tokens, load_run_history
+
+# Fraction of sentences kept per chunk; 1.0 disables compression
+EXTRACTIVE_KEEP_RATIO = float(os.getenv("FRD_EXTRACTIVE_KEEP_RATIO", "0.6"))
+# Chunks with fewer sentences than this are sent as they are
+MIN_SENTENCES_TO_COMPRESS = 6
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"'])")
+REQUIREMENT_WORDS = re.compile(r"\b(shall|must)\b", re.IGNORECASE)
+
+
+def split_sentences(chunk):
+    # (paragraph index, sentence) pairs, so the kept sentences can be put back in place
+    sentences = []
+    for p, para in enumerate(chunk.split("\n")):
+        para = para.strip()
+        if not para:
+            continue
+        if is_heading(para):
+            sentences.append((p, para))
+            continue
+        sentences += [(p, s.strip()) for s in SENTENCE_BOUNDARY.split(para) if s.strip()]
+    return sentences
+
+
+def is_requirement_sentence(sentence):
+    return bool(REQUIREMENT_ID_PATTERN.search(sentence) or REQUIREMENT_WORDS.search(sentence))
+
+
+def textrank(sentences):
+    # PageRank over the sentence similarity graph; a uniform score when there's no vocabulary
+    try:
+        vectors = TfidfVectorizer(stop_words="english", sublinear_tf=True).fit_transform(sentences).toarray()
+    except ValueError:
+        return np.full(len(sentences), 1.0 / len(sentences))
+    # TF-IDF rows are L2-normalised, so the dot product is the cosine similarity
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(similarity, out_weight, out=np.zeros_like(similarity), where=out_weight > 0)
+    n = len(sentences)
+    scores = np.full(n, 1.0 / n)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / n + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            return updated
+        scores = updated
+    return scores
+
+
+def compress_chunk(chunk, keep_ratio=EXTRACTIVE_KEEP_RATIO):
+    sentences = split_sentences(chunk)
+    if keep_ratio >= 1.0 or len(sentences) < MIN_SENTENCES_TO_COMPRESS:
+        return chunk
+
+    protected, candidates, seen = set(), [], set()
+    for i, (_, sentence) in enumerate(sentences):
+        if is_requirement_sentence(sentence):
+            protected.add(i)
+            continue
+        key = " ".join(sentence.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        if is_heading(sentence):
+            protected.add(i)
+        else:
+            candidates.append(i)
+
+    budget = max(0, math.ceil(keep_ratio * len(sentences)) - len(protected))
+    kept = set(protected)
+    if candidates and budget:
+        scores = textrank([sentences[i][1] for i in candidates])
+        kept.update(candidates[j] for j in np.argsort(-scores, kind="stable")[:budget])
+
+    paragraphs = {}
+    for i in sorted(kept):
+        p, sentence = sentences[i]
+        paragraphs.setdefault(p, []).append(sentence)
+    return "\n".join(" ".join(parts) for _, parts in sorted(paragraphs.items()))
+
+
+def compress_chunks(chunks, stage_config, keep_ratio=EXTRACTIVE_KEEP_RATIO, history=None):
+    # Returns (compressed chunks, stats). The saving is in LLM seconds summed over the chunk
+    # calls, estimated from the chunk summary calibration in the run history and net of
+    # the local compression time
+    started = time.perf_counter()
+    compressed = [compress_chunk(chunk, keep_ratio) for chunk in chunks]
+    compress_s = time.perf_counter() - started
+
+    calibration = StageCalibration(CHUNK_SUMMARY, load_run_history() if history is None else history)
+    original_tokens = [count_tokens(chunk, stage_config.model) for chunk in chunks]
+    compressed_tokens = [count_tokens(chunk, stage_config.model) for chunk in compressed]
+    saved_llm_s = sum(
+        calibration.latency_s(calibration.completion_tokens(before, stage_config.max_tokens))
+        - calibration.latency_s(calibration.completion_tokens(after, stage_config.max_tokens))
+        for before, after in zip(original_tokens, compressed_tokens)
+    )
+    before, after = sum(original_tokens), sum(compressed_tokens)
+    return compressed, {
+        "keep_ratio": keep_ratio,
+        "chunks": len(chunks),
+        "original_tokens": before,
+        "compressed_tokens": after,
+        "token_reduction": round(1 - after / before, 3) if before else 0.0,
+        "compress_s": round(compress_s, 3),
+        "estimated_llm_s_saved": round(saved_llm_s - compress_s, 2),
+    }
@@ -0,0 +1,123 @@
+# hedging.py
+
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from llm_executor import current_session_id, llm_executor, run_api_call
+from llm_stages import percentile
+
+# Latency samples kept per stage for the p95 hedge trigger
+HISTORY_WINDOW = 200
+# Don't hedge until a stage has enough history for p95 to mean something
+MIN_SAMPLES_FOR_HEDGING = 20
+# Never hedge sooner than this, whatever the history says
+MIN_HEDGE_DELAY_S = 2.0
+
+
+class LatencyTracker:
+    # Process-wide latency history per stage; feeds the hedge delay and the stats view
+    def __init__(self, window=HISTORY_WINDOW):
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+        self._calls = Counter()
+        self._hedged = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage, latency_s, hedged=False):
+        with self._lock:
+            self._samples[stage].append(latency_s)
+            self._calls[stage] += 1
+            self._hedged[stage] += hedged
+
+    def hedge_delay(self, stage):
+        with self._lock:
+            samples = list(self._samples[stage])
+        if len(samples) < MIN_SAMPLES_FOR_HEDGING:
+            return None
+        return max(MIN_HEDGE_DELAY_S, percentile(samples, 95))
+
+    def stats(self):
+        with self._lock:
+            snapshot = {stage: list(samples) for stage, samples in self._samples.items()}
+            calls, hedged = dict(self._calls), dict(self._hedged)
+        return {
+            stage: {
+                "calls": calls[stage],
+                "hedge_rate": round(hedged[stage] / calls[stage], 3),
+                "p50_s": round(percentile(samples, 50), 3),
+                "p95_s": round(percentile(samples, 95), 3),
+                "p99_s": round(percentile(samples, 99), 3),
+            }
+            for stage, samples in snapshot.items()
+        }
+
+
+latency_tracker = LatencyTracker()
+
+
+def _start_primary(fn):
+    # The caller already holds its LLM executor slot (or is a script thread), so the
+    # primary attempt gets its own thread; like every attempt it then waits for an API
+    # call slot, which it keeps until its request finishes, even after losing
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(run_api_call(fn))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, name="llm-attempt", daemon=True).start()
+    return future
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def hedged_call(fn, stage, timeout=None, hedge=True, tracker=latency_tracker, deadline_bound=False):
+    # Runs fn() with a deadline. If it is still running after the stage's p95 latency a
+    # duplicate is sent; the first successful response wins and the other is cancelled
+    # (or, if already in flight, left to hit its own request timeout and discarded).
+    # The duplicate is an extra API call, so it queues in the shared LLM executor like
+    # any other. Returns (result, hedged). Raises TimeoutError when the deadline passes.
+    # deadline_bound: timeout was cut short by the caller's own deadline, so running into
+    # it says nothing about the stage's latency and isn't recorded
+    started = time.perf_counter()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    futures = [_start_primary(fn)]
+
+    hedge_delay = tracker.hedge_delay(stage) if hedge else None
+    if hedge_delay is not None:
+        remaining = _remaining(deadline)
+        done, _ = wait(futures, timeout=hedge_delay if remaining is None else min(hedge_delay, remaining))
+        if not done and _remaining(deadline) != 0.0:
+            futures.append(llm_executor.submit(current_session_id(), run_api_call, fn))
+    hedged = len(futures) > 1
+
+    pending, error = set(futures), None
+    while pending:
+        done, pending = wait(pending, timeout=_remaining(deadline), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            for loser in pending:
+                loser.cancel()
+            # Measured from the primary's start, so a winning hedge records what the
+            # caller actually waited rather than only its own share
+            tracker.record(stage, time.perf_counter() - started, hedged)
+            return future.result(), hedged
+
+    if error is not None and not pending:
+        raise error
+    for straggler in pending:
+        straggler.cancel()
+    # Count the timeout in the history so p95 reflects the real tail
+    if not deadline_bound:
+        tracker.record(stage, timeout, hedged)
+    raise TimeoutError(f"{stage} call exceeded its {timeout}s deadline")
@@ -5,11 +5,30 @@ from typing import TypedDict
 from langchain.chat_models import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
 import os
+from llm_stages import PATTERN_EXTRACTION, FINAL_GENERATION, StageTimer, build_stage_config
+from prompt_layout import layout_prompt, response_cache
+from hedging import hedged_call
 
 # Set your OpenAI key
 os.environ["OPENAI_API_KEY"] = "your-openai-key"
 
-llm = ChatOpenAI(model_name="gpt-4-turbo", temperature=0.2)
+MODEL = "gpt-4-turbo"
+
+# Per-stage model, token and latency budgets
+STAGE_CONFIG = build_stage_config(MODEL)
+stage_llms = {
+    stage: ChatOpenAI(model_name=config.model, temperature=0.2, max_tokens=config.max_tokens,
+                      request_timeout=config.timeout_s)
+    for stage, config in STAGE_CONFIG.items()
+}
+
+def call_stage_llm(state, stage, messages):
+    config = STAGE_CONFIG[stage]
+    with StageTimer(state.get("run_metadata"), stage, config) as timer:
+        timer.response, timer.hedged = hedged_call(
+            lambda: stage_llms[stage](messages), stage, timeout=config.timeout_s, hedge=config.hedge
+        )
+    return timer.response
 
 # ✅ Define State Schema with new 'frd_pattern'
 class FRDState(TypedDict):
@@ -19,11 +38,22 @@ class FRDState(TypedDict):
     user_notes: str
     new_frd: str
     frd_pattern: str
+    run_metadata: object
 
 # ✅ Node: Extract FRD structural and formatting pattern
 def extract_frd_pattern_node(state: FRDState) -> FRDState:
     existing_frd_summary = state["existing_frd"]
 
+    # The pattern only depends on the reference FRD, so reuse it across runs to keep
+    # the generation prompt's prefix byte-identical
+    cache_key = response_cache.key(STAGE_CONFIG[PATTERN_EXTRACTION].model, existing_frd_summary)
+    cached_pattern = response_cache.get(cache_key)
+    if cached_pattern is not None:
+        return {
+            **state,
+            "frd_pattern": cached_pattern
+        }
+
     pattern_prompt = f"""
 You are a professional technical writer.
 
@@ -37,10 +67,11 @@ FRD Summary:
 {existing_frd_summary}
 """
 
-    result = llm([
+    result = call_stage_llm(state, PATTERN_EXTRACTION, [
         SystemMessage(content="Extract structural and language patterns from an FRD."),
         HumanMessage(content=pattern_prompt)
     ])
+    response_cache.put(cache_key, result.content)
 
     return {
         **state,
@@ -60,26 +91,23 @@ def generate_frd_node(state: FRDState) -> FRDState:
         "based on the new BRD. Match the format and writing style of the existing FRD."
     )
 
-    user_prompt = f"""
-STRUCTURE AND STYLE TO FOLLOW:
-{frd_pattern}
-
-EXISTING BRD SUMMARY:
-{existing_brd_summary}
-
-EXISTING FRD SUMMARY:
-{existing_frd_summary}
-
-NEW BRD SUMMARY:
-{new_brd_summary}
-
-USER NOTES (if any):
-{user_notes}
-"""
+    # Stable reference material first so it forms a cacheable prefix; new BRD and notes last
+    reference_prompt, request_prompt = layout_prompt(
+        [
+            ("STRUCTURE AND STYLE TO FOLLOW", frd_pattern),
+            ("EXISTING BRD SUMMARY", existing_brd_summary),
+            ("EXISTING FRD SUMMARY", existing_frd_summary),
+        ],
+        [
+            ("NEW BRD SUMMARY", new_brd_summary),
+            ("USER NOTES (if any)", user_notes),
+        ]
+    )
 
-    result = llm([
+    result = call_stage_llm(state, FINAL_GENERATION, [
         SystemMessage(content=system_prompt),
-        HumanMessage(content=user_prompt)
+        HumanMessage(content=reference_prompt),
+        HumanMessage(content=request_prompt)
     ])
 
     return {
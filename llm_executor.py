@@ -0,0 +1,174 @@
+# llm_executor.py
+#
+# One process-wide pool for LLM work shared by every Streamlit session. Queued work is
+# dispatched round-robin across sessions (weighted, if a session is given a weight above
+# 1), so one large document can't starve everyone else.
+#
+# The executor's slots bound the fan-out work, not the API calls: an attempt abandoned by
+# a winning hedge or a deadline keeps its request running after its slot is reused. So
+# every call made through hedging.hedged_call (all of app.py, main_app.py and
+# langgraph_workflow.py, script-thread calls included) also holds one of LLM_CONCURRENCY
+# API call slots until its request has really finished. t1.py calls the client directly:
+# its chunk summaries are bounded by the executor, its other calls are not capped.
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+from llm_stages import percentile
+
+LLM_CONCURRENCY = int(os.getenv("FRD_LLM_CONCURRENCY", "16"))
+# Stats for sessions with nothing queued or running are dropped after this long
+SESSION_STATS_TTL_S = 3600
+WAIT_SAMPLES_PER_SESSION = 500
+
+
+# Session whose task an executor worker is running, so nested submissions (hedges,
+# per-segment fallbacks) are queued for the same session
+_task_session = threading.local()
+_api_call_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+
+def run_api_call(fn):
+    with _api_call_slots:
+        return fn()
+
+
+def streamlit_session_id():
+    # Streamlit session of the calling script thread; plain scripts share one queue
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "default"
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+
+# Finds the session of a calling script thread; load_harness.py replaces it
+session_resolver = streamlit_session_id
+
+
+def current_session_id():
+    session_id = getattr(_task_session, "id", None)
+    return session_id if session_id is not None else session_resolver()
+
+
+class _Session:
+    def __init__(self, session_id, weight):
+        self.id = session_id
+        self.weight = weight
+        self.queue = deque()
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES_PER_SESSION)
+        self.last_active = time.monotonic()
+
+
+class FairShareExecutor:
+    def __init__(self, max_concurrency=LLM_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._sessions = OrderedDict()
+        self._condition = threading.Condition()
+        # Round-robin position: (session id, tasks left in its current turn)
+        self._turn = None
+        self._workers = [
+            threading.Thread(target=self._work, name=f"llm-executor-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def set_weight(self, session_id, weight):
+        with self._condition:
+            self._session(session_id).weight = max(1, int(weight))
+
+    def submit(self, session_id, fn, *args, **kwargs):
+        future = Future()
+        with self._condition:
+            session = self._session(session_id)
+            session.queue.append((future, fn, args, kwargs, time.monotonic()))
+            session.submitted += 1
+            session.last_active = time.monotonic()
+            self._condition.notify()
+        return future
+
+    def stats(self):
+        now = time.monotonic()
+        with self._condition:
+            for session_id in [
+                sid for sid, s in self._sessions.items()
+                if not s.queue and not s.running and now - s.last_active > SESSION_STATS_TTL_S
+            ]:
+                del self._sessions[session_id]
+            sessions = {
+                session_id: {
+                    "weight": s.weight,
+                    "queued": len(s.queue),
+                    "running": s.running,
+                    "submitted": s.submitted,
+                    "completed": s.completed,
+                    "p50_wait_s": round(percentile(list(s.waits), 50), 3) if s.waits else 0.0,
+                    "max_wait_s": round(max(s.waits), 3) if s.waits else 0.0,
+                }
+                for session_id, s in self._sessions.items()
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": sum(s["queued"] for s in sessions.values()),
+            "running": sum(s["running"] for s in sessions.values()),
+            "sessions": sessions,
+        }
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(session_id, 1)
+        return session
+
+    def _next_task(self):
+        # Caller holds the condition. Stay with the current session for `weight` tasks,
+        # then move to the next session that has work queued
+        if self._turn is not None:
+            session_id, left = self._turn
+            session = self._sessions.get(session_id)
+            if session is not None and session.queue and left > 0:
+                self._turn = (session_id, left - 1)
+                return session
+            if session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+        for session_id, session in self._sessions.items():
+            if session.queue:
+                self._turn = (session_id, session.weight - 1)
+                return session
+        self._turn = None
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                session = self._next_task()
+                while session is None:
+                    self._condition.wait()
+                    session = self._next_task()
+                future, fn, args, kwargs, queued_at = session.queue.popleft()
+                if not future.set_running_or_notify_cancel():
+                    continue
+                session.waits.append(time.monotonic() - queued_at)
+                session.running += 1
+            _task_session.id = session.id
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                _task_session.id = None
+                with self._condition:
+                    session.running -= 1
+                    session.completed += 1
+                    session.last_active = time.monotonic()
+
+
+llm_executor = FairShareExecutor()
@@ -0,0 +1,285 @@
+# llm_stages.py
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Small, fast model used for high-volume work (chunk summaries)
+FAST_MODEL = os.getenv("FRD_FAST_MODEL", "gpt-4o-mini")
+
+# Pipeline stages, in the order they run
+CHUNK_SUMMARY = "chunk_summary"
+REDUCE = "reduce"
+PATTERN_EXTRACTION = "pattern_extraction"
+FINAL_GENERATION = "final_generation"
+TEST_SCENARIOS = "test_scenarios"
+TRACE_CONFIRMATION = "trace_confirmation"
+SECTION_REGENERATION = "section_regeneration"
+STAGES = [CHUNK_SUMMARY, REDUCE, PATTERN_EXTRACTION, FINAL_GENERATION, TEST_SCENARIOS, TRACE_CONFIRMATION,
+          SECTION_REGENERATION]
+
+# Combined chunk summaries above this many words are condensed by the reduce stage
+REDUCE_TRIGGER_WORDS = 6000
+
+# Every LLM call of every run is appended here; the dry-run planner calibrates from it
+RUN_HISTORY_PATH = os.getenv("FRD_RUN_HISTORY", ".frd_run_history.jsonl")
+RUN_HISTORY_LIMIT = 5000
+
+# Cheap validation thresholds for the chunk summary cascade
+MIN_SUMMARY_WORDS = 25
+MIN_REQUIREMENT_ID_RECALL = 0.5
+REQUIREMENT_ID_PATTERN = re.compile(r"\b[A-Z]{2,}[-_]?\d+(?:\.\d+)*\b")
+REFUSAL_MARKERS = ("i'm sorry", "i am sorry", "i cannot", "i can't", "as an ai")
+
+# Used until the run history has enough calls for a stage
+DEFAULT_COMPLETION_RATIO = {CHUNK_SUMMARY: 0.3, REDUCE: 0.5, PATTERN_EXTRACTION: 0.3, FINAL_GENERATION: 1.0}
+DEFAULT_BASE_LATENCY_S = 1.0
+DEFAULT_SECONDS_PER_COMPLETION_TOKEN = 0.02
+MIN_CALIBRATION_CALLS = 5
+
+
+@dataclass
+class StageConfig:
+    model: str
+    max_tokens: int
+    latency_budget_s: float
+    # Larger model to retry with when the output fails validation (None = no cascade)
+    escalation_model: str = None
+    # Hard per-call deadline; the request is abandoned after this many seconds
+    timeout_s: float = 120
+    # Send a duplicate request when a call runs past the stage's observed p95 latency
+    hedge: bool = False
+
+
+def build_stage_config(large_model, fast_model=FAST_MODEL, cascade=True):
+    # Every stage can be overridden with FRD_<STAGE>_MODEL, e.g. FRD_CHUNK_SUMMARY_MODEL
+    config = {
+        CHUNK_SUMMARY: StageConfig(fast_model, 800, 20, large_model if cascade else None, timeout_s=60, hedge=True),
+        REDUCE: StageConfig(large_model, 1500, 45, timeout_s=90),
+        PATTERN_EXTRACTION: StageConfig(large_model, 1000, 45, timeout_s=90),
+        FINAL_GENERATION: StageConfig(large_model, 3000, 180, timeout_s=300),
+        TEST_SCENARIOS: StageConfig(large_model, 4000, 120, timeout_s=240),
+        TRACE_CONFIRMATION: StageConfig(fast_model, 5, 10, timeout_s=30, hedge=True),
+        SECTION_REGENERATION: StageConfig(large_model, 3000, 60, timeout_s=120),
+    }
+    for stage, stage_config in config.items():
+        stage_config.model = os.getenv(f"FRD_{stage.upper()}_MODEL", stage_config.model)
+    return config
+
+
+def percentile(values, q):
+    # Nearest-rank percentile, q in [0, 100]
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def usage_from_response(response):
+    # Works for openai<1.0 objects, openai>=1.0 objects, plain dicts and LangChain messages
+    usage = getattr(response, "usage", None)
+    if usage is None and isinstance(response, dict):
+        usage = response.get("usage")
+    if usage is None:
+        usage = (getattr(response, "response_metadata", None) or {}).get("token_usage")
+    if usage is None:
+        return 0, 0, 0
+    if not isinstance(usage, dict):
+        usage = usage.to_dict() if hasattr(usage, "to_dict") else vars(usage)
+    # Tokens served from the provider's prompt prefix cache
+    details = usage.get("prompt_tokens_details") or {}
+    if not isinstance(details, dict):
+        details = vars(details)
+    return (
+        usage.get("prompt_tokens", 0) or 0,
+        usage.get("completion_tokens", 0) or 0,
+        details.get("cached_tokens", 0) or 0,
+    )
+
+
+def is_valid_summary(summary, chunk, finish_reason=None):
+    # Cheap checks only - this decides whether a chunk is escalated to the larger model
+    if not summary or not summary.strip():
+        return False
+    if finish_reason == "length":
+        return False
+    lowered = summary.strip().lower()
+    if lowered.startswith("[error") or any(lowered.startswith(marker) for marker in REFUSAL_MARKERS):
+        return False
+    if len(summary.split()) < min(MIN_SUMMARY_WORDS, len(chunk.split()) // 4):
+        return False
+    chunk_ids = set(REQUIREMENT_ID_PATTERN.findall(chunk))
+    if chunk_ids:
+        kept = chunk_ids & set(REQUIREMENT_ID_PATTERN.findall(summary))
+        if len(kept) / len(chunk_ids) < MIN_REQUIREMENT_ID_RECALL:
+            return False
+    return True
+
+
+@dataclass
+class RunMetadata:
+    calls: list = field(default_factory=list)
+    # Extractive pre-compression stats per document, when enabled
+    compression: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, stage, model, latency_s, budget_s=None, prompt_tokens=0, completion_tokens=0,
+               cached_tokens=0, escalated=False, hedged=False, segments=1):
+        with self._lock:
+            self.calls.append({
+                "stage": stage,
+                "model": model,
+                "latency_s": round(latency_s, 3),
+                "over_budget": budget_s is not None and latency_s > budget_s,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cached_tokens": cached_tokens,
+                "escalated": escalated,
+                "hedged": hedged,
+                "segments": segments,
+            })
+
+    def record_compression(self, document, stats):
+        with self._lock:
+            self.compression[document] = stats
+
+    def by_stage(self):
+        with self._lock:
+            calls = list(self.calls)
+        summary = {}
+        for stage in STAGES:
+            stage_calls = [c for c in calls if c["stage"] == stage]
+            if not stage_calls:
+                continue
+            latencies = [c["latency_s"] for c in stage_calls]
+            prompt_tokens = sum(c["prompt_tokens"] for c in stage_calls)
+            cached_tokens = sum(c["cached_tokens"] for c in stage_calls)
+            summary[stage] = {
+                "models": sorted({c["model"] for c in stage_calls}),
+                "calls": len(stage_calls),
+                # Above 1 when small chunks were packed into shared requests
+                "chunks_per_call": round(sum(c.get("segments", 1) for c in stage_calls) / len(stage_calls), 2),
+                "escalations": sum(c["escalated"] for c in stage_calls),
+                "over_budget": sum(c["over_budget"] for c in stage_calls),
+                "hedge_rate": round(sum(c["hedged"] for c in stage_calls) / len(stage_calls), 3),
+                "total_latency_s": round(sum(latencies), 3),
+                "p50_latency_s": percentile(latencies, 50),
+                "p99_latency_s": percentile(latencies, 99),
+                "max_latency_s": max(latencies),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": sum(c["completion_tokens"] for c in stage_calls),
+                "cached_tokens": cached_tokens,
+                "cache_hit_rate": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+            }
+        return summary
+
+
+class StageTimer:
+    # Context manager measuring one LLM call; fill in .response (and .hedged) before leaving the block
+    def __init__(self, run_metadata, stage, stage_config, model=None, escalated=False):
+        self.run_metadata = run_metadata
+        self.stage = stage
+        self.stage_config = stage_config
+        self.model = model or stage_config.model
+        self.escalated = escalated
+        self.hedged = False
+        self.segments = 1
+        self.response = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.run_metadata is not None:
+            prompt_tokens, completion_tokens, cached_tokens = usage_from_response(self.response)
+            self.run_metadata.record(
+                self.stage, self.model, time.perf_counter() - self.start,
+                budget_s=self.stage_config.latency_budget_s,
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                cached_tokens=cached_tokens, escalated=self.escalated, hedged=self.hedged,
+                segments=self.segments,
+            )
+        return False
+
+
+def append_run_history(run_metadata, path=RUN_HISTORY_PATH):
+    with run_metadata._lock:
+        calls = list(run_metadata.calls)
+    recorded_at = time.time()
+    try:
+        with open(path, "a", encoding="utf-8") as history:
+            for call in calls:
+                history.write(json.dumps({**call, "recorded_at": recorded_at}) + "\n")
+    except OSError as e:
+        print(f"Could not write run history to {path}: {e}")
+
+
+def load_run_history(path=RUN_HISTORY_PATH, limit=RUN_HISTORY_LIMIT):
+    # Most recent `limit` calls, oldest first
+    if not os.path.exists(path):
+        return []
+    calls = deque(maxlen=limit)
+    with open(path, encoding="utf-8") as history:
+        for line in history:
+            try:
+                calls.append(json.loads(line))
+            except ValueError:
+                continue
+    return list(calls)
+
+
+def count_tokens(text, model=None):
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return len(encoding.encode(text))
+    # Rough English average when tiktoken isn't installed
+    return int(len(text.split()) * 4 / 3) + 1
+
+
+class StageCalibration:
+    # Completion size, escalation rate and latency per stage, fitted from past calls
+    def __init__(self, stage, history):
+        calls = [c for c in history if c.get("stage") == stage and c.get("prompt_tokens")]
+        self.calibrated = len(calls) >= MIN_CALIBRATION_CALLS
+        self.completion_ratio = DEFAULT_COMPLETION_RATIO.get(stage, 0.5)
+        self.escalation_rate = 0.0
+        self.base_latency_s = DEFAULT_BASE_LATENCY_S
+        self.seconds_per_token = DEFAULT_SECONDS_PER_COMPLETION_TOKEN
+        if not self.calibrated:
+            return
+        self.completion_ratio = sum(c["completion_tokens"] for c in calls) / sum(c["prompt_tokens"] for c in calls)
+        self.escalation_rate = sum(bool(c.get("escalated")) for c in calls) / len(calls)
+        # Least-squares fit of latency = base + per_token * completion_tokens
+        xs = [c["completion_tokens"] for c in calls]
+        ys = [c["latency_s"] for c in calls]
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        variance = sum((x - mean_x) ** 2 for x in xs)
+        if variance > 0:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+            if slope > 0:
+                self.seconds_per_token = slope
+                self.base_latency_s = max(0.0, mean_y - slope * mean_x)
+                return
+        self.seconds_per_token = mean_y / mean_x if mean_x else DEFAULT_SECONDS_PER_COMPLETION_TOKEN
+        self.base_latency_s = 0.0
+
+    def completion_tokens(self, prompt_tokens, max_tokens):
+        return min(max_tokens, max(1, int(prompt_tokens * self.completion_ratio)))
+
+    def latency_s(self, completion_tokens):
+        return self.base_latency_s + self.seconds_per_token * completion_tokens
@@ -0,0 +1,285 @@
+# load_harness.py
+#
+# Drives N simulated Streamlit sessions of app.py / main_app.py headlessly with
+# Streamlit's AppTest API against a local stub LLM, and reports how latency, memory,
+# threads and LLM concurrency scale. t1.py isn't supported: it needs modules that aren't
+# in this repo (langchainNodes, getts_utils) and an external graph.
+#
+#   python load_harness.py --app app.py --sessions 1,5,10,20 --llm-latency 0.5
+
+import argparse
+import io
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest import mock
+
+import docx
+import streamlit
+from streamlit.testing.v1 import AppTest
+
+import llm_executor
+from llm_stages import percentile
+from request_packing import PACKED_SUMMARY_SYSTEM_PROMPT
+
+SUPPORTED_APPS = ("app.py", "main_app.py")
+GENERATE_BUTTON_LABEL = "Generate New FRD"
+SESSION_ID_KEY = "_load_harness_session_id"
+SAMPLE_INTERVAL_S = 0.05
+SCRIPT_TIMEOUT_S = 900
+
+SEGMENT_PATTERN = re.compile(r"<<<SEGMENT (\d+)>>>\n(.*?)\n<<<END SEGMENT \1>>>", re.DOTALL)
+
+WORDS = (
+    "order trade client account allocation settlement booking price quantity broker "
+    "report validation limit approval workflow screen field user system batch"
+).split()
+
+
+class StubLLM:
+    # Stands in for the OpenAI / LangChain clients; sleeps to mimic network latency and
+    # counts calls in flight
+    def __init__(self, latency_s=0.5, jitter=0.5, seed=0):
+        self.latency_s = latency_s
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _echo(prompt):
+        # Echo the requirement IDs and the head of the prompt so summaries pass validation
+        ids = " ".join(sorted(set(re.findall(r"\b[A-Z]{2,}[-_]?\d+(?:\.\d+)*\b", prompt))))
+        return f"{ids} {' '.join(prompt.split()[:80])}".strip()
+
+    def _complete(self, prompt, packed=False):
+        with self._lock:
+            self.in_flight += 1
+            self.total_calls += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            delay = self.latency_s * self.random.lognormvariate(0, self.jitter)
+        try:
+            time.sleep(delay)
+            if packed:
+                # Packed chunk summaries answer in the JSON the apps parse, one entry per segment
+                return json.dumps({"summaries": [
+                    {"segment": int(n), "summary": self._echo(text)} for n, text in SEGMENT_PATTERN.findall(prompt)
+                ]})
+            return self._echo(prompt)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def reset_peaks(self):
+        with self._lock:
+            self.peak_in_flight = self.in_flight
+            self.total_calls = 0
+
+    # openai<1.0: openai.ChatCompletion.create(...) and openai>=1.0: client.chat.completions.create(...)
+    def create(self, *args, messages=(), **kwargs):
+        packed = bool(messages) and messages[0]["content"] == PACKED_SUMMARY_SYSTEM_PROMPT
+        content = self._complete(messages[-1]["content"] if messages else "", packed)
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")],
+            usage={"prompt_tokens": prompt_tokens, "completion_tokens": len(content.split())},
+        )
+
+    # LangChain: chat_model(messages) -> message with .content
+    def __call__(self, messages, *args, **kwargs):
+        content = self._complete(messages[-1].content if messages else "")
+        return SimpleNamespace(content=content, response_metadata={})
+
+
+class SimulatedUpload(io.BytesIO):
+    # Minimal stand-in for Streamlit's UploadedFile
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+def make_docx(paragraph_count, seed, prefix):
+    rng = random.Random(seed)
+    document = docx.Document()
+    for i in range(paragraph_count):
+        body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))
+        document.add_paragraph(f"{prefix}-{i + 1} The system shall {body}.")
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_session_uploads(session_id, paragraphs):
+    # Every session gets distinct documents so the response cache can't hide LLM work
+    return {
+        "existing_brd": make_docx(paragraphs, session_id * 3, "BR"),
+        "existing_frd": make_docx(paragraphs, session_id * 3 + 1, "FR"),
+        "new_brd": make_docx(paragraphs, session_id * 3 + 2, "NBR"),
+    }
+
+
+def fake_file_uploader(session_uploads):
+    # Streamlit's AppTest can't drive file_uploader, so uploads are served per simulated
+    # session, looked up through the session id planted in session_state
+    def file_uploader(label, *args, **kwargs):
+        uploads = session_uploads.get(streamlit.session_state.get(SESSION_ID_KEY))
+        if not uploads:
+            return None
+        lowered = label.lower()
+        key = "new_brd" if "new brd" in lowered else "existing_frd" if "frd" in lowered else "existing_brd"
+        return SimulatedUpload(uploads[key], f"{key}.docx")
+    return file_uploader
+
+
+def harness_session_id():
+    # AppTest gives every simulated session the same Streamlit id, so the LLM executor
+    # queues them by the id planted in session_state instead
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    if get_script_run_ctx() is None:
+        return "default"
+    planted = streamlit.session_state.get(SESSION_ID_KEY)
+    return llm_executor.streamlit_session_id() if planted is None else f"load-harness-{planted}"
+
+
+def read_rss_mb():
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak_rss_mb = 0.0
+        self.peak_threads = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak_rss_mb = max(self.peak_rss_mb, read_rss_mb())
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            self._stop_event.wait(SAMPLE_INTERVAL_S)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_session(app_path, session_id):
+    at = AppTest.from_file(app_path, default_timeout=SCRIPT_TIMEOUT_S)
+    at.session_state[SESSION_ID_KEY] = session_id
+    at.run()
+    button = next(b for b in at.button if GENERATE_BUTTON_LABEL in b.label)
+    start = time.perf_counter()
+    button.click().run()
+    elapsed = time.perf_counter() - start
+    errors = [e.value for e in at.error] + [str(e.value) for e in at.exception]
+    return elapsed, errors
+
+
+def run_level(app_path, sessions, paragraphs, stub, session_uploads):
+    session_uploads.clear()
+    for session_id in range(sessions):
+        session_uploads[session_id] = make_session_uploads(session_id, paragraphs)
+
+    stub.reset_peaks()
+    sampler = ResourceSampler()
+    sampler.start()
+    wall_start = time.perf_counter()
+    results = [None] * sessions
+
+    def worker(session_id):
+        try:
+            results[session_id] = run_session(app_path, session_id)
+        except Exception as e:
+            results[session_id] = (time.perf_counter() - wall_start, [repr(e)])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_s = time.perf_counter() - wall_start
+    sampler.stop()
+
+    latencies = [elapsed for elapsed, _ in results]
+    return {
+        "sessions": sessions,
+        "p50_s": percentile(latencies, 50),
+        "p99_s": percentile(latencies, 99),
+        "wall_s": wall_s,
+        "peak_rss_mb": sampler.peak_rss_mb,
+        "peak_threads": sampler.peak_threads,
+        "peak_llm_in_flight": stub.peak_in_flight,
+        "llm_calls": stub.total_calls,
+        "failed_sessions": sum(1 for _, errors in results if errors),
+    }
+
+
+def stub_patches(stub, session_uploads):
+    import openai
+    patches = [
+        mock.patch.object(streamlit, "file_uploader", fake_file_uploader(session_uploads)),
+        mock.patch.object(llm_executor, "session_resolver", harness_session_id),
+        mock.patch.object(openai, "ChatCompletion", SimpleNamespace(create=stub.create)),
+    ]
+    try:
+        from openai.resources.chat.completions import Completions
+        patches.append(mock.patch.object(Completions, "create", lambda self, *a, **kw: stub.create(*a, **kw)))
+    except ImportError:
+        pass
+    try:
+        import langgraph_workflow
+        patches.append(mock.patch.dict(langgraph_workflow.stage_llms, {stage: stub for stage in langgraph_workflow.stage_llms}))
+    except ImportError:
+        pass
+    return patches
+
+
+def print_report(app_path, rows):
+    print(f"\nLoad test: {app_path}")
+    header = ("sessions", "p50_s", "p99_s", "wall_s", "peak_rss_mb", "peak_threads", "peak_llm_in_flight", "llm_calls", "failed_sessions")
+    print("  ".join(f"{h:>18}" for h in header))
+    for row in rows:
+        print("  ".join(f"{row[h]:>18.2f}" if isinstance(row[h], float) else f"{row[h]:>18}" for h in header))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-session load test for the Streamlit apps")
+    parser.add_argument("--app", default="app.py", help="Streamlit script to drive (app.py or main_app.py)")
+    parser.add_argument("--sessions", default="1,5,10,20", help="Comma-separated concurrency levels")
+    parser.add_argument("--paragraphs", type=int, default=200, help="Paragraphs per synthetic document")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Median stub LLM latency in seconds")
+    args = parser.parse_args(argv)
+    if os.path.basename(args.app) not in SUPPORTED_APPS:
+        parser.error(f"--app must be one of {', '.join(SUPPORTED_APPS)}")
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.app)))
+    stub = StubLLM(latency_s=args.llm_latency)
+    session_uploads = {}
+    rows = []
+    with ExitStack() as stack:
+        for patch in stub_patches(stub, session_uploads):
+            stack.enter_context(patch)
+        for sessions in (int(level) for level in args.sessions.split(",")):
+            rows.append(run_level(args.app, sessions, args.paragraphs, stub, session_uploads))
+            print_report(args.app, rows[-1:])
+    print_report(args.app, rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,133 @@
 # main_app.py
 
 import streamlit as st
-import docx
-from pptx import Presentation
-import concurrent.futures
 import os
-from langgraph_workflow import build_frd_graph
+import time
+from langgraph_workflow import build_frd_graph, STAGE_CONFIG
+from llm_stages import CHUNK_SUMMARY, SECTION_REGENERATION, RunMetadata, StageTimer, append_run_history, is_valid_summary
+from prompt_layout import response_cache
+from documents import chunk_text, parse_documents
+from dry_run import LANGGRAPH_PIPELINE, plan_frd_run, plan_rows
+from request_packing import latency_key, packed_max_tokens, packed_messages, parse_packed_summaries
+from hedging import hedged_call, latency_tracker
+from delta_frd import REGENERATED, ADDED, TRUNCATED, EMPTY, NOT_ADDED, generate_delta_frd
+from extractive import EXTRACTIVE_KEEP_RATIO, compress_chunks
+from llm_executor import LLM_CONCURRENCY, current_session_id, llm_executor
+from chunk_summaries import MAX_FAILED_CHUNK_RATIO, DocumentSummary, failure_summary, run_summaries
 from openai import OpenAIError
 import openai
 
 # Set your OpenAI API key
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-# Utility: Read docx
-def read_docx(file):
-    doc = docx.Document(file)
-    return "\n".join(p.text for p in doc.paragraphs if p.text.strip())
-
-# Utility: Read pptx
-def read_pptx(file):
-    prs = Presentation(file)
-    return "\n".join(shape.text for slide in prs.slides for shape in slide.shapes if hasattr(shape, "text") and shape.text.strip())
-
-# Split into chunks for GPT
-def chunk_paragraphs(text, max_tokens=1500):
-    paragraphs = text.split("\n")
-    chunks, current_chunk = [], ""
-    for para in paragraphs:
-        if len(current_chunk + para) < max_tokens:
-            current_chunk += para + "\n"
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = para + "\n"
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
+SUMMARY_SYSTEM_PROMPT = "Summarize in a business analyst style."
+# Overall time allowed for summarizing one document
+DOCUMENT_DEADLINE_S = 600
+# Chunk summaries run on the process-wide LLM executor; a session on its own gets the whole cap
+SUMMARY_WORKERS = LLM_CONCURRENCY
+
+# Chunk summary call on the fast model, optionally escalated to the large one
+def call_chunk_llm(messages, run_metadata=None, model=None, escalated=False, deadline=None, max_tokens=None, segments=1):
+    stage_config = STAGE_CONFIG[CHUNK_SUMMARY]
+    timeout = stage_config.timeout_s
+    if deadline is not None:
+        timeout = max(0.0, min(timeout, deadline - time.monotonic()))
+    if timeout <= 0:
+        raise TimeoutError("chunk summary started after the document deadline")
+    with StageTimer(run_metadata, CHUNK_SUMMARY, stage_config, model, escalated) as timer:
+        timer.segments = segments
+        timer.response, timer.hedged = hedged_call(
+            lambda: openai.ChatCompletion.create(
+                model=timer.model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=max_tokens or stage_config.max_tokens,
+                request_timeout=timeout
+            ),
+            # A duplicate of a packed request would double the cost packing saves
+            latency_key(CHUNK_SUMMARY, segments), timeout=timeout, hedge=stage_config.hedge and segments == 1,
+            deadline_bound=timeout < stage_config.timeout_s
+        )
+    return timer.response.choices[0]
+
+# One FRD section rewritten for delta mode
+def call_section_llm(messages, run_metadata=None):
+    stage_config = STAGE_CONFIG[SECTION_REGENERATION]
+    with StageTimer(run_metadata, SECTION_REGENERATION, stage_config) as timer:
+        timer.response, timer.hedged = hedged_call(
+            lambda: openai.ChatCompletion.create(
+                model=timer.model,
+                messages=messages,
+                temperature=0.2,
+                max_tokens=stage_config.max_tokens,
+                request_timeout=stage_config.timeout_s
+            ),
+            SECTION_REGENERATION, timeout=stage_config.timeout_s, hedge=stage_config.hedge
+        )
+    choice = timer.response.choices[0]
+    return choice.message.content, choice.finish_reason
 
 # Safe GPT summarizer
-def summarize_chunk_safe(chunk):
+def summarize_chunk_safe(chunk, run_metadata=None, deadline=None):
+    # Identical chunks give identical summaries, keeping reference prompts cache-friendly
+    cache_key = response_cache.key(STAGE_CONFIG[CHUNK_SUMMARY].model, SUMMARY_SYSTEM_PROMPT, chunk)
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    messages = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": chunk}
+    ]
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": "Summarize in a business analyst style."},
-                {"role": "user", "content": chunk}
-            ],
-            temperature=0.2
-        )
-        return response.choices[0].message.content.strip()
-    except OpenAIError as e:
-        return f"[Error summarizing chunk: {e}]"
+        choice = call_chunk_llm(messages, run_metadata, deadline=deadline)
+        escalation_model = STAGE_CONFIG[CHUNK_SUMMARY].escalation_model
+        if escalation_model and not is_valid_summary(choice.message.content, chunk, choice.finish_reason):
+            choice = call_chunk_llm(messages, run_metadata, model=escalation_model, escalated=True, deadline=deadline)
+        response_cache.put(cache_key, choice.message.content.strip())
+        return choice.message.content.strip()
+    except (OpenAIError, TimeoutError) as e:
+        # Reported as a failed chunk by the caller, which can retry it later
+        print(f"Error summarizing chunk: {e}")
+        return None
+
+# Packed summarizer: several small chunks in one request; unusable segments come back as None
+# and are resubmitted to the LLM executor as single-chunk calls
+def summarize_pack_safe(chunks, run_metadata=None, deadline=None):
+    cache_keys = [response_cache.key(STAGE_CONFIG[CHUNK_SUMMARY].model, SUMMARY_SYSTEM_PROMPT, chunk) for chunk in chunks]
+    summaries = [response_cache.get(key) for key in cache_keys]
+    pending = [i for i, summary in enumerate(summaries) if summary is None]
+    if len(pending) > 1:
+        try:
+            choice = call_chunk_llm(
+                packed_messages([chunks[i] for i in pending]), run_metadata, deadline=deadline,
+                max_tokens=packed_max_tokens(len(pending)), segments=len(pending)
+            )
+            parsed = parse_packed_summaries(choice.message.content, len(pending)) or [None] * len(pending)
+            for i, summary in zip(pending, parsed):
+                if summary is not None and is_valid_summary(summary, chunks[i]):
+                    summaries[i] = summary
+                    response_cache.put(cache_keys[i], summary)
+        except (OpenAIError, TimeoutError) as e:
+            print(f"Error summarizing packed chunks, falling back to single calls: {e}")
+    return summaries
 
 # Parallel summarizer
-def summarize_document(text):
-    chunks = chunk_paragraphs(text)
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        summaries = list(executor.map(summarize_chunk_safe, chunks))
-    return "\n".join(summaries)
+def summarize_document(text, run_metadata=None, keep_ratio=None, document="document"):
+    chunks = chunk_text(text)
+    if keep_ratio is not None and keep_ratio < 1.0:
+        chunks, compression = compress_chunks(chunks, STAGE_CONFIG[CHUNK_SUMMARY], keep_ratio)
+        if run_metadata is not None:
+            run_metadata.record_compression(document, compression)
+    return summarize_chunks(DocumentSummary(document, chunks), range(len(chunks)), run_metadata)
+
+# First pass, or a retry of only the failed chunks; stragglers past the deadline are reported, not awaited
+def summarize_chunks(result, indices, run_metadata=None):
+    return run_summaries(
+        result, indices,
+        lambda chunks, deadline: summarize_pack_safe(chunks, run_metadata, deadline),
+        lambda chunk, deadline: summarize_chunk_safe(chunk, run_metadata, deadline),
+        DOCUMENT_DEADLINE_S
+    )
 
 # Streamlit UI
 st.set_page_config(layout="wide", page_title="AI FRD Generator")
@@ -74,33 +145,125 @@ if option == "Generate FRD":
     with col2:
         new_brd_file = st.file_uploader("Upload New BRD", type=["docx", "pptx"])
         user_notes = st.text_area("Additional Notes (Optional)", height=150)
+        delta_mode = st.checkbox(
+            "Delta mode: the new BRD amends the existing BRD",
+            help="Only FRD sections driven by changed BRD sections are regenerated; the rest is copied verbatim."
+        )
+        precompress = st.checkbox(
+            "Pre-compress chunks locally before summarizing",
+            help="Keeps the most salient sentences of each chunk; requirement sentences (IDs, shall, must) are always kept."
+        )
+        keep_ratio = st.slider("Fraction of sentences to keep", 0.2, 1.0, EXTRACTIVE_KEEP_RATIO, 0.05) if precompress else None
+
+    def read_files():
+        # Parsed concurrently, and not at all when the same files were parsed before
+        return parse_documents({"existing_brd": existing_brd_file, "existing_frd": existing_frd_file, "new_brd": new_brd_file})
+
+    if st.button("Estimate (dry run)"):
+        if not all([existing_brd_file, existing_frd_file, new_brd_file]):
+            st.error("Please upload all required documents.")
+        else:
+            plan = plan_frd_run(
+                {name: chunk_text("\n".join(paragraphs)) for name, paragraphs in read_files().items()},
+                STAGE_CONFIG, SUMMARY_WORKERS, LANGGRAPH_PIPELINE,
+                system_prompts={CHUNK_SUMMARY: SUMMARY_SYSTEM_PROMPT}
+            )
+            total = plan["total"]
+            cost = "n/a" if total["cost_usd"] is None else f"${total['cost_usd']:.2f}"
+            st.info(
+                f"{total['calls']} LLM calls, {total['prompt_tokens']:,} prompt / {total['completion_tokens']:,} completion tokens, "
+                f"about {total['wall_s'] / 60:.1f} min at {SUMMARY_WORKERS} workers, estimated cost {cost}"
+            )
+            st.dataframe(plan_rows(plan), use_container_width=True)
 
     if st.button("Generate New FRD", type="primary"):
         if not all([existing_brd_file, existing_frd_file, new_brd_file]):
             st.error("Please upload all required documents.")
         else:
-            with st.spinner("Reading and summarizing documents..."):
-                def read_file(f): return read_docx(f) if f.name.endswith(".docx") else read_pptx(f)
-                existing_brd_text = read_file(existing_brd_file)
-                existing_frd_text = read_file(existing_frd_file)
-                new_brd_text = read_file(new_brd_file)
+            run_metadata = RunMetadata()
+            st.session_state.pop("pending_summaries", None)
+            parsed = read_files()
+            existing_brd_text, existing_frd_text, new_brd_text = ("\n".join(parsed[name]) for name in ("existing_brd", "existing_frd", "new_brd"))
+
+            if delta_mode:
+                with st.spinner("Regenerating the FRD sections affected by the BRD changes..."):
+                    try:
+                        new_frd_text, delta_report = generate_delta_frd(
+                            # The parsed paragraphs keep the document's heading styles
+                            parsed["existing_brd"], parsed["existing_frd"], parsed["new_brd"],
+                            lambda messages: call_section_llm(messages, run_metadata)
+                        )
+                        changed = sum(row["action"] in (REGENERATED, ADDED) for row in delta_report)
+                        st.success(f"✅ FRD updated: {changed} of {len(delta_report)} sections regenerated or added, the rest copied verbatim.")
+                        truncated = sum(row["action"] in (TRUNCATED, EMPTY, NOT_ADDED) for row in delta_report)
+                        if truncated:
+                            st.warning(f"{truncated} sections came back cut off at the output token limit or empty and were left unchanged. Review them by hand.")
+                        st.download_button("Download New FRD (txt)", new_frd_text, file_name="Generated_FRD.txt")
+                        append_run_history(run_metadata)
+                        with st.expander("Delta details (per FRD section)"):
+                            st.dataframe(delta_report, use_container_width=True)
+                        with st.expander("Run details (model and latency per stage)"):
+                            st.json(run_metadata.by_stage())
+                    except Exception as e:
+                        st.error(f"Failed to generate FRD: {e}")
+            else:
+                with st.spinner("Reading and summarizing documents..."):
+                    document_summaries = {
+                        "existing_brd": summarize_document(existing_brd_text, run_metadata, keep_ratio, "existing_brd"),
+                        "existing_frd": summarize_document(existing_frd_text, run_metadata, keep_ratio, "existing_frd"),
+                        "new_brd": summarize_document(new_brd_text, run_metadata, keep_ratio, "new_brd"),
+                    }
+                # Kept across reruns so failed chunks can be retried without redoing the rest
+                st.session_state.pending_summaries = (document_summaries, run_metadata)
 
-                summary_brd = summarize_document(existing_brd_text)
-                summary_frd = summarize_document(existing_frd_text)
-                summary_new_brd = summarize_document(new_brd_text)
+    if "pending_summaries" in st.session_state:
+        document_summaries, run_metadata = st.session_state.pending_summaries
+        failed, total, blocked = failure_summary(document_summaries.values())
+        generate_now = failed == 0
+        if failed:
+            if blocked:
+                st.error(f"{failed} of {total} chunks could not be summarized, above the {MAX_FAILED_CHUNK_RATIO:.0%} limit. "
+                         "Retry the failed chunks before generating the FRD.")
+            else:
+                st.warning(f"{failed} of {total} chunks could not be summarized. "
+                           "You can retry them, or generate the FRD with those chunks missing.")
+            st.dataframe([row for summary in document_summaries.values() for row in summary.failure_rows()],
+                         use_container_width=True)
+            if st.button("Retry failed chunks", type="primary"):
+                with st.spinner(f"Re-summarizing {failed} failed chunks..."):
+                    for summary in document_summaries.values():
+                        summarize_chunks(summary, summary.failed(), run_metadata)
+                st.rerun()
+            generate_now = st.button("Generate with missing chunks", disabled=blocked)
 
+        if generate_now:
+            del st.session_state.pending_summaries
             with st.spinner("Generating FRD using LangGraph..."):
                 try:
                     graph = build_frd_graph()
                     result = graph.invoke({
-                        "existing_brd": summary_brd,
-                        "existing_frd": summary_frd,
-                        "new_brd": summary_new_brd,
-                        "user_notes": user_notes
+                        "existing_brd": document_summaries["existing_brd"].text("\n"),
+                        "existing_frd": document_summaries["existing_frd"].text("\n"),
+                        "new_brd": document_summaries["new_brd"].text("\n"),
+                        "user_notes": user_notes,
+                        "run_metadata": run_metadata
                     })
                     new_frd_text = result["new_frd"]
                     st.success("✅ FRD Generated Successfully!")
                     st.download_button("Download New FRD (txt)", new_frd_text, file_name="Generated_FRD.txt")
+                    append_run_history(run_metadata)
+                    with st.expander("Run details (model and latency per stage)"):
+                        st.json(run_metadata.by_stage())
+                        if run_metadata.compression:
+                            st.caption("Extractive pre-compression per document")
+                            st.dataframe([{"document": name, **stats} for name, stats in run_metadata.compression.items()],
+                                         use_container_width=True)
+                        st.caption("Latency and hedging across all runs on this server")
+                        st.json(latency_tracker.stats())
+                        executor_stats = llm_executor.stats()
+                        st.caption(f"Shared LLM executor: {executor_stats['running']} running, {executor_stats['queue_depth']} queued "
+                                   f"(cap {executor_stats['max_concurrency']}); this session's queue wait:")
+                        st.json(executor_stats["sessions"].get(current_session_id(), {}))
 
                 except Exception as e:
                     st.error(f"Failed to generate FRD: {e}")
@@ -0,0 +1,234 @@
+# scenario_generator.py
+
+import csv
+import json
+import os
+import tempfile
+import threading
+import weakref
+from concurrent.futures import as_completed
+
+from openpyxl import Workbook
+
+from documents import is_heading
+from llm_executor import current_session_id, llm_executor
+
+SCENARIO_COLUMNS = ["Scenario ID", "FRD Section", "Title", "Preconditions", "Steps", "Expected Result", "Priority"]
+SCENARIO_FIELDS = ["title", "preconditions", "steps", "expected_result", "priority"]
+
+# Sections longer than this are split so one call never has to cover a huge section
+SECTION_MAX_WORDS = 1500
+
+# Sections whose scenarios are incomplete, reported on the job
+TRUNCATED = "Cut off at the output token limit; later scenarios are missing"
+UNPARSED = "No scenarios could be parsed from the response"
+
+SCENARIO_SYSTEM_PROMPT = (
+    "You are a senior QA analyst. Write functional test scenarios for the FRD section you are given. "
+    "Cover positive, negative and boundary cases for every requirement. "
+    "Respond with a JSON array only. Each item must have the keys "
+    '"title", "preconditions", "steps", "expected_result" and "priority" (High, Medium or Low).'
+)
+
+
+def split_frd_sections(paragraphs, max_words=SECTION_MAX_WORDS):
+    sections, title, body, words = [], "Introduction", [], 0
+    for para in paragraphs:
+        tokens = len(para.split())
+        if is_heading(para) or (body and words + tokens > max_words):
+            if body:
+                sections.append((title, "\n".join(body)))
+            if is_heading(para):
+                title, body, words = para.strip(), [], 0
+                continue
+            body, words = [], 0
+        body.append(para)
+        words += tokens
+    if body:
+        sections.append((title, "\n".join(body)))
+    return sections
+
+
+def parse_scenarios(text):
+    # Models sometimes wrap the JSON in prose or code fences; items are read one by one
+    # from the first array, so a reply cut off at the token limit keeps its complete items
+    start = text.find("[")
+    if start == -1:
+        return []
+    decoder, items, pos = json.JSONDecoder(), [], start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+        items.append(item)
+    scenarios = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        row = {}
+        for key in SCENARIO_FIELDS:
+            value = item.get(key, "")
+            row[key] = "\n".join(map(str, value)) if isinstance(value, list) else str(value)
+        scenarios.append(row)
+    return scenarios
+
+
+def generate_scenarios(sections, complete, session_id=None, stop_event=None):
+    # Fans out one call per section on the shared LLM executor and yields
+    # (section_title, scenarios, problem) as each finishes; problem is None for a clean section.
+    # complete(system_prompt, user_prompt) -> (response text, finish_reason)
+    session_id = current_session_id() if session_id is None else session_id
+    futures = {
+        llm_executor.submit(session_id, complete, SCENARIO_SYSTEM_PROMPT, f"FRD SECTION: {title}\n\n{body}"): title
+        for title, body in sections
+    }
+    try:
+        for future in as_completed(futures):
+            if stop_event is not None and stop_event.is_set():
+                break
+            title = futures[future]
+            try:
+                text, finish_reason = future.result()
+            except Exception as e:
+                print(f"Error generating scenarios for section {title!r}: {e}")
+                yield title, [], f"Failed: {e}"
+                continue
+            scenarios = parse_scenarios(text)
+            if finish_reason == "length":
+                yield title, scenarios, TRUNCATED
+            else:
+                yield title, scenarios, None if scenarios else UNPARSED
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+class ScenarioSpool:
+    # Scenarios go straight to a CSV file on disk, so memory stays flat however many
+    # rows are produced; .xlsx exports are written from it to temp files on request.
+    def __init__(self):
+        handle, self.path = tempfile.mkstemp(prefix="scenarios_", suffix=".csv")
+        self._file = os.fdopen(handle, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._lock = threading.Lock()
+        self.row_count = 0
+        # (row count, path) of the latest .xlsx export, or None
+        self.export = None
+        self._exports = set()
+        self._finalizer = weakref.finalize(self, _remove_spool, self._file, self.path, self._exports)
+
+    def append(self, section_title, scenarios):
+        with self._lock:
+            for scenario in scenarios:
+                self.row_count += 1
+                self._writer.writerow(
+                    [f"TS-{self.row_count:05d}", section_title] + [scenario[key] for key in SCENARIO_FIELDS]
+                )
+            self._file.flush()
+
+    def iter_rows(self, limit=None):
+        with self._lock:
+            limit = self.row_count if limit is None else limit
+        with open(self.path, newline="", encoding="utf-8") as spool:
+            for i, row in enumerate(csv.reader(spool)):
+                if i >= limit:
+                    break
+                yield row
+
+    def export_xlsx(self):
+        # Only built when the user asks for it, never per rerun: the page polls while
+        # generation runs. Replaces the previous export; returns (row count, path)
+        with self._lock:
+            row_count = self.row_count
+        # Write-only workbook: rows are streamed to the file instead of held as cell objects
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Test Scenarios")
+        sheet.append(SCENARIO_COLUMNS)
+        for row in self.iter_rows(row_count):
+            sheet.append(row)
+        handle, path = tempfile.mkstemp(prefix="scenarios_", suffix=".xlsx")
+        os.close(handle)
+        workbook.save(path)
+        self._exports.add(path)
+        self.discard_export()
+        self.export = (row_count, path)
+        return self.export
+
+    def discard_export(self):
+        if self.export is not None:
+            path = self.export[1]
+            self.export = None
+            self._exports.discard(path)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        self._finalizer()
+
+
+def _remove_spool(spool_file, path, exports):
+    spool_file.close()
+    for spooled in [path, *exports]:
+        if os.path.exists(spooled):
+            os.remove(spooled)
+    exports.clear()
+
+
+class ScenarioJob:
+    # Runs generation in a background thread so it survives Streamlit reruns (e.g. a click
+    # on the partial-download button) while the UI polls row_count / done.
+    def __init__(self, sections, complete):
+        # The job thread has no Streamlit context, so its calls are queued under the
+        # session that started it
+        self.session_id = current_session_id()
+        self.spool = ScenarioSpool()
+        self.sections_total = len(sections)
+        self.sections_done = 0
+        self.recent = []
+        # Sections that failed or came back incomplete, for the UI to list
+        self.issues = []
+        self.error = None
+        self._closed = False
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(sections, complete), daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, sections, complete):
+        try:
+            for title, scenarios, problem in generate_scenarios(sections, complete, self.session_id, self._stop_event):
+                self.spool.append(title, scenarios)
+                if problem is not None:
+                    self.issues.append({"FRD Section": title, "Problem": problem, "Scenarios kept": len(scenarios)})
+                self.sections_done += 1
+                # Keep only a small preview in memory
+                self.recent = (self.recent + [(title, s["title"]) for s in scenarios])[-20:]
+        except Exception as e:
+            self.error = e
+        finally:
+            if self._closed:
+                self.spool.close()
+
+    @property
+    def row_count(self):
+        return self.spool.row_count
+
+    @property
+    def done(self):
+        return not self._thread.is_alive()
+
+    def cancel(self):
+        self._stop_event.set()
+
+    def close(self):
+        # The spool is removed now, or by the worker thread once in-flight sections finish
+        self._closed = True
+        self.cancel()
+        if self.done:
+            self.spool.close()
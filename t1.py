@@ -2,9 +2,7 @@ import debugpy
 import sys
 import os
 import streamlit as st
-from docx import Document
-from pptx import Presentation
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 import time
 from openai import OpenAI
 from httpx import Client
@@ -13,6 +11,11 @@ from langgraph.graph import StateGraph
 from typing import TypedDict
 from langchainNodes import build_frd_graph
 from getts_utils import parse_docx_sections, format_frd_text
+from documents import read_docx, chunk_paragraphs, parse_document
+from scenario_generator import ScenarioJob, split_frd_sections
+from traceability import build_traceability, traceability_to_xlsx
+from llm_executor import current_session_id, llm_executor
+from document_store import DocumentStore, reference_text
 
 # Setup debugger
 try:
@@ -40,33 +43,28 @@ client = OpenAI(
 
 # Constants
 MODEL = "03-mini"
-MAX_TOKENS_PER_CHUNK = 2000
 SUMMARY_MAX_TOKENS = 800
+# Only the head of the FRD is shown on the page; the full text is in the download
+FRD_PREVIEW_CHARS = 20_000
 
 SECTIONS = [
     "introduction",
     "scenario"
 ]
 
-# Utility functions
-def read_docx(uploaded_file):
-    doc = Document(uploaded_file)
-    return [para.text.strip() for para in doc.paragraphs if para.text.strip()]
-
-def chunk_paragraphs(paragraphs, max_tokens=MAX_TOKENS_PER_CHUNK):
-    chunks, current_chunk, current_tokens = [], [], 0
-    for para in paragraphs:
-        tokens = len(para.split())
-        if current_tokens + tokens > max_tokens:
-            chunks.append("\n".join(current_chunk))
-            current_chunk, current_tokens = [para], tokens
-        else:
-            current_chunk.append(para)
-            current_tokens += tokens
-    if current_chunk:
-        chunks.append("\n".join(current_chunk))
-    return chunks
+# Fixed enhancement instructions go ahead of the user's changes so the prompt prefix
+# stays byte-identical between enhance runs (provider prefix caching)
+ENHANCEMENT_GUIDELINES = """Please revise the existing FRD by intelligently incorporating the user-requested changes below.
+
+GUIDELINES:
+1. Merge changes contextually where they belong
+2. Maintain all existing valid content
+3. Keep the professional FRD format
+4. Add new sections only if needed
+5. Return the complete revised FRD
+"""
 
+# Utility functions
 def summarize_chunk_safe(chunk, retry_count=3):
     for attempt in range(retry_count):
         try:
@@ -90,21 +88,31 @@ def summarize_document(paragraphs):
     progress_bar = st.progress(0)
     total = len(chunks)
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(summarize_chunk_safe, chunk): i for i, chunk in enumerate(chunks)}
-        completed = 0
-        for future in as_completed(futures):
-            i = futures[future]
-            try:
-                summaries[i] = future.result()
-            except Exception as e:
-                summaries[i] = "[Error]"
-            completed += 1
-            progress_bar.progress(completed / total)
+    session_id = current_session_id()
+    futures = {llm_executor.submit(session_id, summarize_chunk_safe, chunk): i for i, chunk in enumerate(chunks)}
+    completed = 0
+    for future in as_completed(futures):
+        i = futures[future]
+        try:
+            summaries[i] = future.result()
+        except Exception as e:
+            summaries[i] = "[Error]"
+        completed += 1
+        progress_bar.progress(completed / total)
 
     progress_bar.empty()
     return "\n\n".join(summaries)
 
+def complete_scenarios(system_prompt, user_prompt):
+    response = client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+    return response.choices[0].message.content, response.choices[0].finish_reason
+
 # Define FRDState type
 class FRDState(TypedDict):
     existing_brd: str
@@ -121,6 +129,17 @@ st.sidebar.markdown("---")
 selected_topic = st.sidebar.radio("Select Functionality", ["Generate FRD", "Generate Test Scenario", "Generate Mockup", "Generate Excel File"], index=0)
 st.title("GETTS")
 
+# Large texts (new BRD, generated FRD) live in a compact per-session store, not as plain strings
+if "documents" not in st.session_state:
+    st.session_state.documents = DocumentStore()
+documents = st.session_state.documents
+# What this session's documents actually hold in memory; spilled texts count only their path
+st.sidebar.caption(f"Session documents in memory: {documents.resident_bytes() / 1024:,.0f} KB")
+
+docs_path = Path("docs/full_data")
+existing_brd_file = docs_path / "Bunching_Orders_Rewriting_BRD(in progress).docx"
+existing_frd_file = docs_path / "BO Functional Requirements Document_signOffVersion.docx"
+
 # ... [previous imports and setup code remains the same] ...
 
 if selected_topic == "Generate FRD":
@@ -132,21 +151,9 @@ if selected_topic == "Generate FRD":
         st.session_state.frd_generated = False
     if 'previous_brd' not in st.session_state:
         st.session_state.previous_brd = None
-    if 'reference_brd_full' not in st.session_state:
-        st.session_state.reference_brd_full = ""
-    if 'reference_frd_full' not in st.session_state:
-        st.session_state.reference_frd_full = ""
-    if 'new_brd_full' not in st.session_state:
-        st.session_state.new_brd_full = ""
-    if 'new_frd_text' not in st.session_state:
-        st.session_state.new_frd_text = ""
     if 'user_notes' not in st.session_state:
         st.session_state.user_notes = ""
 
-    docs_path = Path("docs/full_data")
-    existing_brd_file = docs_path / "Bunching_Orders_Rewriting_BRD(in progress).docx"
-    existing_frd_file = docs_path / "BO Functional Requirements Document_signOffVersion.docx"
-
     new_brd_file = st.file_uploader("Upload New BRD (.docx)", type="docx", key="brd_uploader")
     current_brd = new_brd_file.name if new_brd_file else None
 
@@ -157,28 +164,30 @@ if selected_topic == "Generate FRD":
     if st.button("Generate New FRD", type="primary", key="generate_frd"):
         try:
             with st.spinner("Summarizing documents..."):
-                st.session_state.reference_brd_full = "\n\n".join(read_docx(existing_brd_file))
-                st.session_state.reference_frd_full = "\n\n".join(read_docx(existing_frd_file))
-                st.session_state.new_brd_full = "\n\n".join(read_docx(new_brd_file)) if new_brd_file else ""
+                # The pre-loaded references are parsed once per process and shared by all sessions
+                reference_brd_full = reference_text(existing_brd_file)
+                reference_frd_full = reference_text(existing_frd_file)
+                new_brd_full = "\n\n".join(parse_document(new_brd_file, read_docx)) if new_brd_file else ""
+                documents.put("new_brd_full", new_brd_full)
 
             with st.spinner("Generating new FRD (this may take a minute)..."):
                 final_graph = build_frd_graph(
                     SECTIONS,
-                    reference_brd_full=st.session_state.reference_brd_full,
-                    reference_frd_full=st.session_state.reference_frd_full,
-                    new_brd_full=st.session_state.new_brd_full,
+                    reference_brd_full=reference_brd_full,
+                    reference_frd_full=reference_frd_full,
+                    new_brd_full=new_brd_full,
                     skip_scenario_refine=True
                 )
 
                 result = final_graph.invoke({
-                    "brd": st.session_state.new_brd_full,
+                    "brd": new_brd_full,
                     "section": "",
                     "analysis": "",
                     "generated": "",
                     "frd_frd": {}
                 })
 
-                st.session_state.new_frd_text = format_frd_text(result["full_frd"])
+                documents.put("new_frd_text", format_frd_text(result["full_frd"]))
                 st.session_state.frd_generated = True
                 st.rerun()  # Force refresh to show the enhancement UI
 
@@ -204,38 +213,30 @@ if selected_topic == "Generate FRD":
                 st.session_state.user_notes = user_notes  # Store the notes before processing
                 try:
                     with st.spinner("Incorporating your changes (this may take a minute)..."):
-                        # Create clear instructions for the LLM
-                        enhancement_prompt = f"""
-                        Please revise the existing FRD by intelligently incorporating these user-requested changes:
-                        
-                        USER REQUESTED CHANGES:
-                        {st.session_state.user_notes}
-                        
-                        GUIDELINES:
-                        1. Merge changes contextually where they belong
-                        2. Maintain all existing valid content
-                        3. Keep the professional FRD format
-                        4. Add new sections only if needed
-                        5. Return the complete revised FRD
-                        """
+                        # Create clear instructions for the LLM: fixed guidelines first, changes last
+                        enhancement_prompt = (
+                            f"{ENHANCEMENT_GUIDELINES}\n"
+                            f"USER REQUESTED CHANGES:\n{st.session_state.user_notes.strip()}\n"
+                        )
                         
+                        new_brd_full = documents.get("new_brd_full")
                         final_graph = build_frd_graph(
                             SECTIONS,
-                            reference_brd_full=st.session_state.reference_brd_full,
-                            reference_frd_full=st.session_state.reference_frd_full,
-                            new_brd_full=st.session_state.new_brd_full,
+                            reference_brd_full=reference_text(existing_brd_file),
+                            reference_frd_full=reference_text(existing_frd_file),
+                            new_brd_full=new_brd_full,
                             skip_scenario_refine=True
                         )
 
                         result = final_graph.invoke({
-                            "brd": st.session_state.new_brd_full,
+                            "brd": new_brd_full,
                             "section": "",
                             "analysis": enhancement_prompt,
-                            "generated": st.session_state.new_frd_text,
+                            "generated": documents.get("new_frd_text"),
                             "frd_frd": {}
                         })
 
-                        st.session_state.new_frd_text = format_frd_text(result["full_frd"])
+                        documents.put("new_frd_text", format_frd_text(result["full_frd"]))
                         st.session_state.user_notes = ""  # Clear notes after successful enhancement
                         st.success("FRD enhanced successfully!")
                         st.rerun()  # Refresh to show updated FRD
@@ -244,15 +245,20 @@ if selected_topic == "Generate FRD":
                     st.error(f"Error enhancing FRD: {str(e)}")
 
         # Display the current FRD
+        new_frd_text = documents.get("new_frd_text")
         st.subheader("Current FRD Version")
+        # No widget key, so the text isn't copied into session_state on top of the document store
+        preview = new_frd_text[:FRD_PREVIEW_CHARS]
+        if len(new_frd_text) > FRD_PREVIEW_CHARS:
+            preview += f"\n\n[... preview truncated, download the FRD for all {len(new_frd_text):,} characters ...]"
         st.text_area("FRD Content", 
-                    st.session_state.new_frd_text, 
+                    preview, 
                     height=400,
-                    key="frd_display")
+                    disabled=True)
         
         st.download_button(
             "Download Current FRD",
-            st.session_state.new_frd_text,
+            new_frd_text,
             file_name="enhanced_frd.txt",
             mime="text/plain"
         )
@@ -261,7 +267,53 @@ if selected_topic == "Generate FRD":
 
 elif selected_topic == "Generate Test Scenario":
     st.header("Generate Test Scenario")
-    st.info("Work in progress")
+
+    if "new_frd_text" not in documents:
+        st.info("Generate an FRD first, then come back to create its test scenarios.")
+    else:
+        scenario_job = st.session_state.get("scenario_job")
+        running = scenario_job is not None and not scenario_job.done
+        if st.button("Generate Test Scenarios", type="primary", key="generate_scenarios", disabled=running):
+            if scenario_job is not None:
+                scenario_job.close()
+            frd_paragraphs = [line.strip() for line in documents.get("new_frd_text").splitlines() if line.strip()]
+            # Runs in the background so partial results stay downloadable across reruns
+            scenario_job = ScenarioJob(split_frd_sections(frd_paragraphs), complete_scenarios)
+            st.session_state.scenario_job = scenario_job
+
+        if scenario_job is not None:
+            st.progress(
+                scenario_job.sections_done / max(scenario_job.sections_total, 1),
+                text=f"{scenario_job.row_count} scenarios from {scenario_job.sections_done}/{scenario_job.sections_total} FRD sections"
+            )
+            if scenario_job.error:
+                st.error(f"Scenario generation stopped: {scenario_job.error}")
+            if scenario_job.issues:
+                st.warning(f"{len(scenario_job.issues)} FRD sections are missing some or all of their scenarios.")
+                st.dataframe(scenario_job.issues, use_container_width=True)
+            # The .xlsx is written to a temp file only when asked for, or once when the job is done
+            export = scenario_job.spool.export
+            if scenario_job.done and (export is None or export[0] != scenario_job.row_count):
+                export = scenario_job.spool.export_xlsx()
+            elif not scenario_job.done and st.button("Prepare partial download", key="prepare_scenarios"):
+                export = scenario_job.spool.export_xlsx()
+            if export is not None:
+                with open(export[1], "rb") as xlsx:
+                    downloaded = st.download_button(
+                        "Download Test Scenarios (.xlsx)" if scenario_job.done else f"Download Partial Results ({export[0]} scenarios, .xlsx)",
+                        xlsx,
+                        file_name="test_scenarios.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
+                if downloaded and not scenario_job.done:
+                    scenario_job.spool.discard_export()
+                    export = None
+                elif not scenario_job.done:
+                    st.caption("Progress updates pause until the partial results are downloaded.")
+            # Polling stops while a partial download is on offer, so its file isn't re-sent every rerun
+            if not scenario_job.done and export is None:
+                time.sleep(2)
+                st.rerun()
 
 elif selected_topic == "Generate Mockup":
     st.header("Generate Mockup Data")
@@ -269,6 +321,23 @@ elif selected_topic == "Generate Mockup":
 
 elif selected_topic == "Generate Excel File":
     st.header("Generate Excel File")
-    st.info("Work in progress")
+
+    if "new_frd_text" not in documents:
+        st.info("Generate an FRD first to build its requirements traceability matrix.")
+    elif st.button("Build Traceability Matrix", type="primary", key="build_traceability"):
+        def split_lines(text): return [line.strip() for line in text.splitlines() if line.strip()]
+        with st.spinner("Matching requirements to FRD sections..."):
+            trace_result = build_traceability(
+                split_lines(documents.get("new_brd_full")),
+                split_lines(documents.get("new_frd_text")),
+                split_lines(reference_text(existing_frd_file))
+            )
+        st.success(f"{len(trace_result['requirements'])} requirements mapped to {len(trace_result['sections'])} FRD sections")
+        st.download_button(
+            "Download Traceability Matrix (.xlsx)",
+            traceability_to_xlsx(trace_result),
+            file_name="traceability_matrix.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
 
 st.markdown("---")
@@ -0,0 +1,7 @@
+# tests/conftest.py
+
+import sys
+from pathlib import Path
+
+# The modules live flat at the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
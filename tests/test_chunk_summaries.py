@@ -0,0 +1,34 @@
+# tests/test_chunk_summaries.py
+
+import threading
+import time
+
+from chunk_summaries import CHUNK_OK, CHUNK_TIMED_OUT, DocumentSummary, run_summaries
+
+
+def test_unusable_pack_segments_are_resubmitted_as_single_calls():
+    chunks = [f"small {i}" for i in range(8)] + ["large " * 600]
+    singles, lock = [], threading.Lock()
+
+    def summarize_pack(pack_chunks, deadline):
+        return [None if chunk.endswith(("0", "4")) else f"summary of {chunk}" for chunk in pack_chunks]
+
+    def summarize_one(chunk, deadline):
+        with lock:
+            singles.append(chunk)
+        return f"summary of {chunk}"
+
+    result = run_summaries(DocumentSummary("doc", chunks), range(len(chunks)), summarize_pack, summarize_one, 5)
+    assert result.statuses == [CHUNK_OK] * len(chunks)
+    assert sorted(singles) == sorted(["small 0", "small 4", "large " * 600])
+
+
+def test_stragglers_past_the_deadline_are_timed_out():
+    def summarize_one(chunk, deadline):
+        time.sleep(0.5 if chunk.startswith("slow") else 0)
+        return "summary"
+
+    chunks = ["fast " * 600, "slow " * 600]
+    result = run_summaries(DocumentSummary("doc", chunks), range(2), None, summarize_one, 0.2)
+    assert result.statuses == [CHUNK_OK, CHUNK_TIMED_OUT]
+    assert result.failed() == [1]
@@ -0,0 +1,53 @@
+# tests/test_delta_frd.py
+
+import pickle
+
+from docx import Document
+
+from delta_frd import EMPTY, KEPT, REGENERATED, TRUNCATED, generate_delta_frd, split_sections
+from documents import Heading, read_docx
+
+
+def write_docx(path, paragraphs):
+    doc = Document()
+    for style, text in paragraphs:
+        doc.add_paragraph(text, style=style)
+    doc.save(path)
+    return path
+
+
+def test_title_case_headings_are_taken_from_paragraph_styles(tmp_path):
+    path = write_docx(tmp_path / "frd.docx", [
+        ("Normal", "Scope of this document."),
+        ("Heading 1", "Order Entry"),
+        ("Normal", "Orders are entered by the agent."),
+        ("Heading 2", "Payment Handling"),
+        ("Normal", "Payments are captured at checkout."),
+    ])
+    paragraphs = read_docx(str(path))
+    assert [isinstance(para, Heading) for para in paragraphs] == [False, True, False, True, False]
+    assert [heading for heading, _ in split_sections(paragraphs)] == [None, "Order Entry", "Payment Handling"]
+    # Headings survive the trip to and from the parse worker processes
+    assert isinstance(pickle.loads(pickle.dumps(paragraphs))[1], Heading)
+
+
+def test_truncated_regeneration_keeps_the_original_section():
+    brd = [Heading("Orders"), "Orders are placed online.", Heading("Payments"), "Cards are accepted."]
+    new_brd = [Heading("Orders"), "Orders are placed online or by phone.", Heading("Payments"), "Cards are accepted."]
+    frd = [Heading("Order Entry"), "Orders are placed online through the web shop.",
+           Heading("Payment Handling"), "Cards are accepted at checkout."]
+
+    def complete(messages):
+        return "Order Entry\nOrders are placed", "length"
+
+    text, report = generate_delta_frd(brd, frd, new_brd, complete)
+    assert "Orders are placed online through the web shop." in text
+    assert [row["action"] for row in report] == [TRUNCATED, KEPT]
+
+    text, report = generate_delta_frd(brd, frd, new_brd, lambda messages: ("  ", "stop"))
+    assert "Orders are placed online through the web shop." in text
+    assert report[0]["action"] == EMPTY
+
+    text, report = generate_delta_frd(brd, frd, new_brd, lambda messages: ("Order Entry\nOrders are placed by phone too.", "stop"))
+    assert "Orders are placed by phone too." in text
+    assert report[0]["action"] == REGENERATED
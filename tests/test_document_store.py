@@ -0,0 +1,23 @@
+# tests/test_document_store.py
+
+import os
+
+import document_store
+from document_store import INLINE_MAX_BYTES, DocumentStore
+
+
+def test_large_texts_are_held_compressed_or_spilled(monkeypatch):
+    store = DocumentStore()
+    small, large = "short text", "The system shall book the order. " * 20_000
+    store.put("small", small)
+    store.put("large", large)
+    assert store.get("small") == small and store.get("large") == large
+    assert len(small) < store.resident_bytes() < INLINE_MAX_BYTES
+
+    monkeypatch.setattr(document_store, "SPILL_MIN_BYTES", 0)
+    store.put("large", large)
+    (path,) = store._paths
+    assert store.get("large") == large and os.path.exists(path)
+    assert store.resident_bytes() == len(small) + len(path)
+    store.close()
+    assert not os.path.exists(path)
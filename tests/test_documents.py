@@ -0,0 +1,85 @@
+# tests/test_documents.py
+
+import io
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import documents
+from documents import ParseCache, parse_documents
+
+parsed_names = []
+
+
+def split_lines(uploaded_file):
+    parsed_names.append(uploaded_file.name)
+    return uploaded_file.read().decode("utf-8").splitlines()
+
+
+def upload(text, name):
+    buffer = io.BytesIO(text.encode("utf-8"))
+    buffer.name = name
+    return buffer
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    parsed_names.clear()
+    monkeypatch.setattr(documents, "parse_cache", ParseCache())
+
+
+def test_cache_evicts_least_recently_used_entries_by_count():
+    cache = ParseCache(max_entries=2)
+    cache.put("a", ["1"])
+    cache.put("b", ["2"])
+    cache.get("a")
+    cache.put("c", ["3"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["1"] and cache.get("c") == ["3"]
+
+
+def test_cache_evicts_by_characters_but_keeps_the_newest_entry():
+    cache = ParseCache(max_chars=10)
+    cache.put("a", ["12345"])
+    cache.put("b", ["12345"])
+    cache.put("c", ["123"])
+    assert cache.get("a") is None
+    assert cache.get("b") == ["12345"] and cache.get("c") == ["123"]
+    cache.put("huge", ["x" * 50])
+    assert cache.get("huge") == ["x" * 50] and cache.get("b") is None
+
+
+def test_cache_hands_out_copies():
+    cache = ParseCache()
+    cache.put("a", ["1", "2"])
+    cache.get("a").append("changed")
+    assert cache.get("a") == ["1", "2"]
+
+
+def test_cache_hits_skip_parsing(monkeypatch):
+    monkeypatch.setattr(documents, "PARSE_WORKERS", 1)
+    files = {"brd": upload("one\ntwo", "brd.txt"), "frd": upload("three", "frd.txt"), "new_brd": None}
+    assert parse_documents(files, split_lines) == {"brd": ["one", "two"], "frd": ["three"], "new_brd": None}
+    assert sorted(parsed_names) == ["brd.txt", "frd.txt"]
+
+    parsed_names.clear()
+    again = parse_documents({"brd": upload("one\ntwo", "renamed.txt"), "frd": upload("changed", "frd.txt")}, split_lines)
+    assert again == {"brd": ["one", "two"], "frd": ["changed"]}
+    assert parsed_names == ["frd.txt"]
+
+
+def test_broken_pool_falls_back_to_parsing_in_process(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            future = Future()
+            future.set_exception(BrokenProcessPool("worker died"))
+            return future
+
+    resets = []
+    monkeypatch.setattr(documents, "PARSE_WORKERS", 2)
+    monkeypatch.setattr(documents, "_pool", BrokenPool)
+    monkeypatch.setattr(documents, "_reset_pool", lambda: resets.append(True))
+    parsed = parse_documents({"brd": upload("one", "brd.txt"), "frd": upload("two", "frd.txt")}, split_lines)
+    assert parsed == {"brd": ["one"], "frd": ["two"]}
+    assert resets and sorted(parsed_names) == ["brd.txt", "frd.txt"]
@@ -0,0 +1,31 @@
+# tests/test_extractive.py
+
+import pytest
+
+from extractive import compress_chunk
+
+FILLER = [
+    "The settlement team reviews the overnight batch output.",
+    "Brokers often call to check the status of an allocation.",
+    "Reports are shared with the operations desk in the morning.",
+    "Historical data is kept for audit purposes.",
+    "Users have asked for a faster screen in the past.",
+    "The legacy workflow relied on spreadsheets.",
+    "Training material is being updated separately.",
+    "Most clients trade during the European session.",
+]
+REQUIREMENTS = [
+    "FR-12 Orders above the client limit are routed for approval.",
+    "The system shall reject trades with a missing account.",
+    "Each allocation must reference exactly one booking.",
+]
+
+
+@pytest.mark.parametrize("keep_ratio", [0.0, 0.1, 0.3, 0.6, 0.9])
+def test_requirement_sentences_survive_any_keep_ratio(keep_ratio):
+    chunk = "ORDER ALLOCATION\n" + " ".join(FILLER[:4] + REQUIREMENTS[:2] + FILLER[4:] + REQUIREMENTS[2:])
+    compressed = compress_chunk(chunk, keep_ratio)
+    for sentence in REQUIREMENTS:
+        assert sentence in compressed
+    assert compressed.startswith("ORDER ALLOCATION")
+    assert len(compressed) < len(chunk)
@@ -0,0 +1,59 @@
+# tests/test_hedging.py
+
+import threading
+import time
+
+import pytest
+
+import llm_executor
+from hedging import MIN_HEDGE_DELAY_S, MIN_SAMPLES_FOR_HEDGING, LatencyTracker, hedged_call
+
+
+def test_timeouts_cut_short_by_the_callers_deadline_are_not_recorded():
+    tracker = LatencyTracker()
+    with pytest.raises(TimeoutError):
+        hedged_call(lambda: time.sleep(0.3), "stage", timeout=0.05, hedge=False, tracker=tracker, deadline_bound=True)
+    assert tracker.stats() == {}
+
+    with pytest.raises(TimeoutError):
+        hedged_call(lambda: time.sleep(0.3), "stage", timeout=0.05, hedge=False, tracker=tracker)
+    assert tracker.stats()["stage"]["calls"] == 1
+
+
+def test_winning_hedge_records_the_wait_since_the_primary_was_sent():
+    tracker = LatencyTracker()
+    for _ in range(MIN_SAMPLES_FOR_HEDGING):
+        tracker.record("stage", 0.01)
+    calls, lock = [], threading.Lock()
+
+    def fn():
+        with lock:
+            calls.append(len(calls))
+            first = len(calls) == 1
+        # The primary stalls, the hedge answers at once
+        time.sleep(MIN_HEDGE_DELAY_S + 1 if first else 0)
+        return "primary" if first else "hedge"
+
+    result, hedged = hedged_call(fn, "stage", timeout=10, tracker=tracker)
+    assert (result, hedged) == ("hedge", True)
+    assert tracker.stats()["stage"]["p99_s"] >= MIN_HEDGE_DELAY_S
+
+
+def test_abandoned_attempts_keep_their_api_call_slot(monkeypatch):
+    monkeypatch.setattr(llm_executor, "_api_call_slots", threading.BoundedSemaphore(2))
+    in_flight, peak, lock = [0], [0], threading.Lock()
+
+    def fn():
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.3)
+        with lock:
+            in_flight[0] -= 1
+
+    # Each call gives up long before its request finishes
+    for _ in range(4):
+        with pytest.raises(TimeoutError):
+            hedged_call(fn, "stage", timeout=0.02, hedge=False, tracker=LatencyTracker())
+    time.sleep(1.0)
+    assert peak[0] == 2 and in_flight[0] == 0
@@ -0,0 +1,57 @@
+# tests/test_imports.py
+#
+# Import smoke tests. Helper modules are imported for real (skipped when a third-party
+# dependency isn't installed); the Streamlit scripts run UI code on import, so their
+# imports from this repo are checked statically against the names each module defines.
+
+import ast
+import importlib
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+REPO_MODULES = {path.stem for path in ROOT.glob("*.py")}
+APP_SCRIPTS = {"app", "main_app", "t1"}
+HELPER_MODULES = sorted(REPO_MODULES - APP_SCRIPTS)
+
+
+def top_level_names(module):
+    tree = ast.parse((ROOT / f"{module}.py").read_text(encoding="utf-8"))
+    names = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Assign):
+            names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            names.add(node.target.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.Try):
+            # Optional dependencies: try: import x / except ImportError: x = None
+            for inner in node.body + [stmt for handler in node.handlers for stmt in handler.body]:
+                if isinstance(inner, (ast.Import, ast.ImportFrom)):
+                    names.update((alias.asname or alias.name).split(".")[0] for alias in inner.names)
+                elif isinstance(inner, ast.Assign):
+                    names.update(target.id for target in inner.targets if isinstance(target, ast.Name))
+    return names
+
+
+@pytest.mark.parametrize("module", sorted(REPO_MODULES))
+def test_repo_imports_resolve(module):
+    tree = ast.parse((ROOT / f"{module}.py").read_text(encoding="utf-8"))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module in REPO_MODULES:
+            missing = {alias.name for alias in node.names} - top_level_names(node.module)
+            assert not missing, f"{module}.py imports {sorted(missing)} from {node.module}, which doesn't define them"
+
+
+@pytest.mark.parametrize("module", HELPER_MODULES)
+def test_helper_module_imports(module):
+    try:
+        importlib.import_module(module)
+    except ModuleNotFoundError as e:
+        if e.name and e.name.split(".")[0] not in REPO_MODULES:
+            pytest.skip(f"{e.name} is not installed")
+        raise
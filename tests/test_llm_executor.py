@@ -0,0 +1,47 @@
+# tests/test_llm_executor.py
+
+import llm_executor
+from llm_executor import FairShareExecutor, current_session_id
+
+
+def dispatch_order(executor, count):
+    # Session of each of the next `count` tasks a worker would pick, without running them
+    order = []
+    with executor._condition:
+        for _ in range(count):
+            session = executor._next_task()
+            if session is None:
+                break
+            session.queue.popleft()
+            order.append(session.id)
+    return order
+
+
+def test_sessions_are_served_round_robin():
+    executor = FairShareExecutor(max_concurrency=0)
+    for _ in range(6):
+        executor.submit("big", print)
+    for _ in range(2):
+        executor.submit("small", print)
+    assert dispatch_order(executor, 10) == ["big", "small", "big", "small", "big", "big", "big", "big"]
+
+
+def test_weighted_session_gets_that_many_tasks_per_turn():
+    executor = FairShareExecutor(max_concurrency=0)
+    executor.set_weight("priority", 3)
+    for _ in range(6):
+        executor.submit("priority", print)
+        executor.submit("other", print)
+    assert dispatch_order(executor, 12) == ["priority"] * 3 + ["other"] + ["priority"] * 3 + ["other"] * 5
+
+
+def test_tasks_submit_nested_work_under_their_own_session():
+    executor = FairShareExecutor(max_concurrency=2)
+    assert executor.submit("session-a", current_session_id).result(timeout=5) == "session-a"
+    assert current_session_id() == "default"
+
+
+def test_session_resolver_can_be_replaced(monkeypatch):
+    monkeypatch.setattr(llm_executor, "session_resolver", lambda: "simulated-3")
+    assert current_session_id() == "simulated-3"
+    assert FairShareExecutor(max_concurrency=1).submit("session-a", current_session_id).result(timeout=5) == "session-a"
@@ -0,0 +1,54 @@
+# tests/test_request_packing.py
+
+import json
+
+from request_packing import (
+    MAX_PACK_SEGMENTS, MAX_PACK_WORDS, SMALL_CHUNK_WORDS, latency_key, parse_packed_summaries, plan_packs,
+)
+
+
+def words(n):
+    return " ".join(["word"] * n)
+
+
+def test_small_chunks_are_packed_and_large_ones_stay_alone():
+    chunks = [words(10), words(10), words(SMALL_CHUNK_WORDS + 1), words(10)]
+    assert plan_packs(chunks) == [[0, 1], [2], [3]]
+
+
+def test_packs_respect_the_segment_and_word_limits():
+    assert plan_packs([words(1)] * (MAX_PACK_SEGMENTS + 1)) == [list(range(MAX_PACK_SEGMENTS)), [MAX_PACK_SEGMENTS]]
+    per_pack = MAX_PACK_WORDS // SMALL_CHUNK_WORDS
+    packs = plan_packs([words(SMALL_CHUNK_WORDS)] * (per_pack + 1))
+    assert packs == [list(range(per_pack)), [per_pack]]
+
+
+def test_parses_summaries_by_segment_number():
+    text = "Here you go:\n" + json.dumps({"summaries": [
+        {"segment": 2, "summary": " second "},
+        {"segment": 1, "summary": "first"},
+    ]})
+    assert parse_packed_summaries(text, 3) == ["first", "second", None]
+
+
+def test_unusable_entries_become_none():
+    text = json.dumps({"summaries": [
+        {"segment": 1, "summary": ""},
+        {"segment": "x", "summary": "bad number"},
+        {"segment": 9, "summary": "out of range"},
+        {"summary": "position 4"},
+        "not an entry",
+    ]})
+    assert parse_packed_summaries(text, 4) == [None, None, None, "position 4"]
+
+
+def test_unparseable_responses_return_none():
+    assert parse_packed_summaries("no json here", 2) is None
+    assert parse_packed_summaries('{"summaries": "nope"}', 2) is None
+    assert parse_packed_summaries('{"summaries": [', 2) is None
+    assert parse_packed_summaries(None, 2) is None
+
+
+def test_packed_calls_have_their_own_latency_key():
+    assert latency_key("chunk_summary", 1) == "chunk_summary"
+    assert latency_key("chunk_summary", 4) != "chunk_summary"
@@ -0,0 +1,47 @@
+# tests/test_scenario_generator.py
+
+import os
+
+from openpyxl import load_workbook
+
+from scenario_generator import SCENARIO_FIELDS, TRUNCATED, ScenarioJob, ScenarioSpool, parse_scenarios
+
+SCENARIO = {key: key for key in SCENARIO_FIELDS}
+
+
+def test_xlsx_exports_are_temp_files_replaced_on_each_request():
+    spool = ScenarioSpool()
+    spool.append("1 Orders", [SCENARIO, SCENARIO])
+    row_count, first = spool.export_xlsx()
+    assert row_count == 2
+    assert len(list(load_workbook(first, read_only=True)["Test Scenarios"].iter_rows())) == 3
+
+    spool.append("2 Payments", [SCENARIO])
+    row_count, second = spool.export_xlsx()
+    assert row_count == 3 and not os.path.exists(first)
+
+    spool.close()
+    assert not os.path.exists(second) and not os.path.exists(spool.path)
+
+
+def test_truncated_array_keeps_its_complete_items():
+    text = '```json\n[{"title": "A", "steps": ["1", "2"]}, {"title": "B"}, {"title": "C", "prec'
+    assert [s["title"] for s in parse_scenarios(text)] == ["A", "B"]
+    assert parse_scenarios(text)[0]["steps"] == "1\n2"
+    assert parse_scenarios("No scenarios, sorry.") == []
+
+
+def test_job_records_truncated_and_failed_sections():
+    def complete(system_prompt, user_prompt):
+        if "Orders" in user_prompt:
+            return '[{"title": "A"}, {"title": "B"}, {"tit', "length"
+        if "Payments" in user_prompt:
+            raise TimeoutError("too slow")
+        return '[{"title": "C"}]', "stop"
+
+    job = ScenarioJob([("1 Orders", "body"), ("2 Payments", "body"), ("3 Reports", "body")], complete)
+    job._thread.join(timeout=5)
+    assert job.done and job.row_count == 3
+    assert sorted((issue["FRD Section"], issue["Scenarios kept"]) for issue in job.issues) == [("1 Orders", 2), ("2 Payments", 0)]
+    assert any(issue["Problem"] == TRUNCATED for issue in job.issues)
+    job.close()
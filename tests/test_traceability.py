@@ -0,0 +1,62 @@
+# tests/test_traceability.py
+
+import numpy as np
+
+import traceability
+from documents import Heading
+from traceability import (
+    BORDERLINE, CONFIRMED, LINKED, NOT_COVERED, REJECTED, build_traceability, extract_requirements,
+)
+
+BRD = [
+    "BR-1 The system shall validate every order before booking it.",
+    "BR-2 The system shall allocate trades to client accounts.",
+    "BR-3 The system shall archive settlement reports every night.",
+]
+FRD = ["1 Orders", "Orders are validated before booking.", "2 Allocation", "Trades are allocated to accounts."]
+REFERENCE_FRD = ["1 Legacy Orders", "Orders were validated by hand."]
+
+
+def fixed_scores(monkeypatch, frd_scores, reference_scores=None):
+    def similarity_matrix(vectorizer, requirements, sections):
+        scores = frd_scores if sections[0][0] == "1 Orders" else reference_scores
+        return np.array(scores, dtype=np.float32)
+    monkeypatch.setattr(traceability, "similarity_matrix", similarity_matrix)
+
+
+def test_styled_headings_are_not_requirements():
+    paragraphs = [Heading("Order Entry Screen Layout And Validation Rules"), BRD[0]]
+    assert extract_requirements(paragraphs) == [("BR-1", BRD[0])]
+
+
+def test_scores_fall_into_link_borderline_and_not_covered_bands(monkeypatch):
+    fixed_scores(monkeypatch, [[0.9, 0.1], [0.1, 0.2], [0.05, 0.0]])
+    result = build_traceability(BRD, FRD)
+    assert [row["status"] for row in result["rows"]] == [LINKED, BORDERLINE, NOT_COVERED]
+    assert [row["frd_section"] for row in result["rows"]] == ["1 Orders", "2 Allocation", "1 Orders"]
+    assert "reference_section" not in result["rows"][0]
+
+
+def test_confirm_is_only_asked_about_borderline_pairs(monkeypatch):
+    fixed_scores(monkeypatch, [[0.9, 0.1], [0.1, 0.2], [0.2, 0.0]])
+    asked = []
+
+    def confirm(requirement, section_title, section_text):
+        asked.append((requirement, section_title))
+        return requirement.startswith("BR-2")
+
+    result = build_traceability(BRD, FRD, confirm=confirm)
+    assert sorted(asked) == [(BRD[1], "2 Allocation"), (BRD[2], "1 Orders")]
+    assert [row["status"] for row in result["rows"]] == [LINKED, CONFIRMED, REJECTED]
+
+
+def test_reference_frd_adds_its_best_section_and_score(monkeypatch):
+    fixed_scores(monkeypatch, [[0.9, 0.1], [0.1, 0.2], [0.05, 0.0]], [[0.7], [0.3], [0.0]])
+    rows = build_traceability(BRD, FRD, REFERENCE_FRD)["rows"]
+    assert [row["reference_section"] for row in rows] == ["1 Legacy Orders"] * 3
+    assert [row["reference_score"] for row in rows] == [0.7, 0.3, 0.0]
+
+
+def test_matching_text_is_linked_end_to_end():
+    result = build_traceability(BRD[:1], FRD)
+    assert result["rows"][0]["frd_section"] == "1 Orders"
@@ -0,0 +1,143 @@
+# traceability.py
+
+import io
+
+import numpy as np
+from openpyxl import Workbook
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from documents import is_heading
+from llm_executor import current_session_id, llm_executor
+from llm_stages import REQUIREMENT_ID_PATTERN
+from scenario_generator import split_frd_sections
+
+# Cosine similarity bands: at or above LINK_THRESHOLD a pair is linked outright, between
+# the two thresholds it is borderline and can be confirmed by the LLM, below it is ignored
+LINK_THRESHOLD = 0.35
+BORDERLINE_THRESHOLD = 0.15
+# Cap on LLM confirmations per matrix, most similar borderline pairs first
+MAX_LLM_CONFIRMATIONS = 200
+# Rows of the similarity matrix computed per batch, to bound memory on large documents
+SIMILARITY_BATCH_ROWS = 1024
+MIN_REQUIREMENT_WORDS = 5
+
+LINKED = "Linked"
+CONFIRMED = "Confirmed by LLM"
+REJECTED = "Rejected by LLM"
+BORDERLINE = "Borderline"
+NOT_COVERED = "Not covered"
+
+
+def extract_requirements(paragraphs):
+    # Each non-heading paragraph of the BRD is a requirement; keep its own ID when it has one
+    requirements = []
+    for para in paragraphs:
+        text = para.strip()
+        if len(text.split()) < MIN_REQUIREMENT_WORDS or is_heading(para):
+            continue
+        match = REQUIREMENT_ID_PATTERN.search(text[:40])
+        requirement_id = match.group(0) if match else f"BRD-{len(requirements) + 1:03d}"
+        requirements.append((requirement_id, text))
+    return requirements
+
+
+def similarity_matrix(vectorizer, requirements, sections):
+    # Sparse TF-IDF rows are L2-normalised, so the dot product is the cosine similarity
+    requirement_vectors = vectorizer.transform([text for _, text in requirements])
+    section_vectors = vectorizer.transform([f"{title}\n{body}" for title, body in sections]).T.tocsc()
+    scores = np.zeros((len(requirements), len(sections)), dtype=np.float32)
+    for start in range(0, len(requirements), SIMILARITY_BATCH_ROWS):
+        batch = requirement_vectors[start:start + SIMILARITY_BATCH_ROWS] @ section_vectors
+        scores[start:start + SIMILARITY_BATCH_ROWS] = batch.toarray()
+    return scores
+
+
+def build_traceability(brd_paragraphs, frd_paragraphs, reference_frd_paragraphs=None, confirm=None):
+    # confirm(requirement_text, section_title, section_text) -> bool, only used for borderline pairs
+    requirements = extract_requirements(brd_paragraphs)
+    sections = split_frd_sections(frd_paragraphs)
+    reference_sections = split_frd_sections(reference_frd_paragraphs) if reference_frd_paragraphs else []
+    if not requirements or not sections:
+        return {"requirements": requirements, "sections": sections, "reference_sections": reference_sections,
+                "scores": np.zeros((len(requirements), len(sections))), "rows": []}
+
+    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True, ngram_range=(1, 2), min_df=1)
+    vectorizer.fit(
+        [text for _, text in requirements]
+        + [f"{title}\n{body}" for title, body in sections + reference_sections]
+    )
+    scores = similarity_matrix(vectorizer, requirements, sections)
+    best = scores.argmax(axis=1)
+    best_scores = scores[np.arange(len(requirements)), best]
+
+    if reference_sections:
+        reference_scores = similarity_matrix(vectorizer, requirements, reference_sections)
+        reference_best = reference_scores.argmax(axis=1)
+        reference_best_scores = reference_scores[np.arange(len(requirements)), reference_best]
+
+    status = np.where(best_scores >= LINK_THRESHOLD, LINKED,
+                      np.where(best_scores >= BORDERLINE_THRESHOLD, BORDERLINE, NOT_COVERED)).astype(object)
+
+    if confirm is not None:
+        borderline = np.flatnonzero(status == BORDERLINE)
+        borderline = borderline[np.argsort(-best_scores[borderline])][:MAX_LLM_CONFIRMATIONS]
+
+        def check(i):
+            title, body = sections[best[i]]
+            try:
+                return confirm(requirements[i][1], title, body)
+            except Exception as e:
+                print(f"Error confirming traceability for {requirements[i][0]}: {e}")
+                return None
+
+        session_id = current_session_id()
+        futures = [llm_executor.submit(session_id, check, i) for i in borderline]
+        for i, future in zip(borderline, futures):
+            verdict = future.result()
+            if verdict is not None:
+                status[i] = CONFIRMED if verdict else REJECTED
+
+    rows = []
+    for i, (requirement_id, text) in enumerate(requirements):
+        row = {
+            "requirement_id": requirement_id,
+            "requirement": text,
+            "frd_section": sections[best[i]][0],
+            "score": round(float(best_scores[i]), 3),
+            "status": status[i],
+        }
+        if reference_sections:
+            row["reference_section"] = reference_sections[reference_best[i]][0]
+            row["reference_score"] = round(float(reference_best_scores[i]), 3)
+        rows.append(row)
+
+    return {"requirements": requirements, "sections": sections, "reference_sections": reference_sections,
+            "scores": scores, "rows": rows}
+
+
+def traceability_to_xlsx(result):
+    workbook = Workbook(write_only=True)
+
+    summary = workbook.create_sheet("Traceability")
+    has_reference = bool(result["reference_sections"])
+    header = ["Requirement ID", "Requirement", "Generated FRD Section", "Similarity", "Status"]
+    if has_reference:
+        header += ["Reference FRD Section", "Reference Similarity"]
+    summary.append(header)
+    for row in result["rows"]:
+        values = [row["requirement_id"], row["requirement"], row["frd_section"], row["score"], row["status"]]
+        if has_reference:
+            values += [row["reference_section"], row["reference_score"]]
+        summary.append(values)
+
+    # Full requirement x section matrix; weak scores are left blank to keep it readable
+    matrix = workbook.create_sheet("Matrix")
+    matrix.append(["Requirement ID"] + [title for title, _ in result["sections"]])
+    for (requirement_id, _), scores in zip(result["requirements"], result["scores"]):
+        matrix.append([requirement_id] + [
+            round(float(score), 3) if score >= BORDERLINE_THRESHOLD else None for score in scores
+        ])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()